@@ -6,6 +6,7 @@ Communicates with Hisense VIDAA-U TVs via WebSocket and bridges to MQTT
 """
 
 import os
+import re
 import sys
 import json
 import time
@@ -14,57 +15,677 @@ import ssl
 import socket
 import hashlib
 import base64
-from threading import Thread
+import binascii
+import signal
+import random
+import heapq
+import selectors
+import ipaddress
+import errno
+import struct
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque, OrderedDict
+from threading import Thread, Event, Lock, Condition
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Iterator, Iterable, Callable, Set, NamedTuple
 
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 import websocket
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad, unpad
 
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
-def load_config():
-    """Load configuration from environment variables"""
+def load_config(environ: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Load configuration from environment variables (os.environ by default)"""
+    env = os.environ if environ is None else environ
     return {
-        'mqtt_broker': os.getenv('MQTT_BROKER', 'localhost'),
-        'mqtt_port': int(os.getenv('MQTT_PORT', '1883')),
-        'mqtt_user': os.getenv('MQTT_USER', ''),
-        'mqtt_password': os.getenv('MQTT_PASSWORD', ''),
-        'mqtt_topic_prefix': os.getenv('MQTT_TOPIC_PREFIX', 'hisense_tv'),
-        'tv_ip': os.getenv('TV_IP', ''),
-        'tv_port': int(os.getenv('TV_PORT', '10001')),
-        'tv_name': os.getenv('TV_NAME', 'salon'),
-        'tv_ssl': os.getenv('TV_SSL', 'false').lower() == 'true',
-        'auto_discovery': os.getenv('AUTO_DISCOVERY', 'true').lower() == 'true',
-        'scan_interval': int(os.getenv('SCAN_INTERVAL', '30')),
-        'log_level': os.getenv('LOG_LEVEL', 'INFO').upper(),
+        'mqtt_broker': env.get('MQTT_BROKER', 'localhost'),
+        'mqtt_port': int(env.get('MQTT_PORT', '1883')),
+        'mqtt_user': env.get('MQTT_USER', ''),
+        'mqtt_password': env.get('MQTT_PASSWORD', ''),
+        'mqtt_topic_prefix': env.get('MQTT_TOPIC_PREFIX', 'hisense_tv'),
+        'mqtt_buffer_size': int(env.get('MQTT_BUFFER_SIZE', '1000')),
+        'mqtt_max_inflight': int(env.get('MQTT_MAX_INFLIGHT', '20')),
+        'mqtt_protocol': env.get('MQTT_PROTOCOL', '3.1.1'),
+        'mqtt_shared_group': env.get('MQTT_SHARED_GROUP', ''),
+        'mqtt_client_id': env.get('MQTT_CLIENT_ID', ''),
+        'tv_ip': env.get('TV_IP', ''),
+        'tv_port': int(env.get('TV_PORT', '10001')),
+        'tv_name': env.get('TV_NAME', 'salon'),
+        'tv_ssl': env.get('TV_SSL', 'false').lower() == 'true',
+        'tv_mac': env.get('TV_MAC', ''),
+        'auto_discovery': env.get('AUTO_DISCOVERY', 'true').lower() == 'true',
+        'scan_interval': int(env.get('SCAN_INTERVAL', '30')),
+        'log_level': env.get('LOG_LEVEL', 'INFO').upper(),
+        'log_format': env.get('LOG_FORMAT', 'text').lower(),
+        'log_debug_sample': int(env.get('LOG_DEBUG_SAMPLE', '1')),
+        'tvs': env.get('TVS', ''),
+        'data_dir': env.get('DATA_DIR', '/data'),
+        'heartbeat_interval': int(env.get('HEARTBEAT_INTERVAL', '300')),
+        'command_rate': float(env.get('COMMAND_RATE', '10')),
+        'command_queue_size': int(env.get('COMMAND_QUEUE_SIZE', '32')),
+        'metrics_port': int(env.get('METRICS_PORT', '0')),
+        'reconnect_max_delay': int(env.get('RECONNECT_MAX_DELAY', '300')),
+        'reconnect_concurrency': int(env.get('RECONNECT_CONCURRENCY', '4')),
+        'power_probe_interval': int(env.get('POWER_PROBE_INTERVAL', '5')),
+        'active_scan_interval': int(env.get('ACTIVE_SCAN_INTERVAL', '2')),
+        'standby_suspend_delay': int(env.get('STANDBY_SUSPEND_DELAY', '60')),
+        'standby_scan_interval': int(env.get('STANDBY_SCAN_INTERVAL', '300')),
+        'push_silence_timeout': int(env.get('PUSH_SILENCE_TIMEOUT', '300')),
+        'wol_broadcast': env.get('WOL_BROADCAST', '255.255.255.255'),
+        'ws_ping_interval': int(env.get('WS_PING_INTERVAL', '10')),
+        'ws_ping_timeout': int(env.get('WS_PING_TIMEOUT', '5')),
+        'liveness_timeout': int(env.get('LIVENESS_TIMEOUT', '30')),
+        'network_discovery': env.get('NETWORK_DISCOVERY', 'false').lower() == 'true',
+        'network_scan_cidr': env.get('NETWORK_SCAN_CIDR', ''),
+        'network_scan_interval': int(env.get('NETWORK_SCAN_INTERVAL', '600')),
     }
 
-CONFIG = load_config()
+def load_tv_configs(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Build the list of TVs driven by this bridge.
+    Fleet mode reads a JSON list from TVS, otherwise falls back to the
+    single TV_IP/TV_NAME configuration.
+    """
+    raw = config['tvs'].strip() if config['tvs'] else ''
+    if raw and raw not in ('[]', 'null'):
+        entries = json.loads(raw)
+    elif config['tv_ip']:
+        entries = [{
+            'name': config['tv_name'],
+            'ip': config['tv_ip'],
+            'port': config['tv_port'],
+            'ssl': config['tv_ssl'],
+            'mac': config['tv_mac'],
+        }]
+    else:
+        entries = []
+
+    tvs = []
+    for entry in entries:
+        tvs.append({
+            'name': str(entry['name']),
+            'ip': str(entry['ip']),
+            'port': int(entry.get('port', config['tv_port'])),
+            'ssl': bool(entry.get('ssl', config['tv_ssl'])),
+            'command_rate': float(entry.get('command_rate', config['command_rate'])),
+            'mac': str(entry.get('mac') or ''),
+        })
+    return tvs
+
+def read_options(path: str) -> Dict[str, str]:
+    """
+    Environment equivalent of the add-on options file, as exported by the
+    run scripts: upper-cased keys, booleans as true/false, lists as JSON
+    """
+    with open(path) as f:
+        options = json.load(f)
+    environ = {}
+    for key, value in options.items():
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        elif isinstance(value, (list, dict)):
+            value = json.dumps(value)
+        elif value is None:
+            value = ''
+        environ[key.upper()] = str(value)
+    return environ
 
 # ============================================================================
 # LOGGING
 # ============================================================================
 
-logging.basicConfig(
-    level=getattr(logging, CONFIG['log_level']),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        # Per-TV loggers are children named after the TV
+        if '.' in record.name:
+            entry['tv'] = record.name.split('.', 1)[1]
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TraceSampler:
+    """Lets one in `every` debug traces of a high-rate path through"""
+
+    def __init__(self, every: int = 1):
+        self.every = max(1, every)
+        self._counts: Dict[str, int] = {}
+
+    def __call__(self, key: str) -> bool:
+        if self.every == 1:
+            return True
+        # Unlocked: a lost increment only shifts the sample
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        return count % self.every == 0
+
+
 logger = logging.getLogger('HisenseMQTTBridge')
+trace_sampler = TraceSampler()
+
+
+def setup_logging(config: Dict[str, Any]):
+    """Apply the logging options, again on every config reload"""
+    handler = logging.StreamHandler()
+    if config['log_format'] == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logging.basicConfig(level=getattr(logging, config['log_level'], logging.INFO),
+                        handlers=[handler], force=True)
+    trace_sampler.every = max(1, config['log_debug_sample'])
+
+
+def should_trace(log: logging.Logger, path: str) -> bool:
+    """Guard for per-message debug traces: DEBUG enabled and sampled in"""
+    return log.isEnabledFor(logging.DEBUG) and trace_sampler(path)
 
 # ============================================================================
 # VALIDATION
 # ============================================================================
 
-if not CONFIG['tv_ip']:
-    logger.error("❌ TV_IP environment variable is required!")
-    sys.exit(1)
+def validate_tv_configs(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """TVs of a configuration, ValueError with a readable message if invalid"""
+    try:
+        tv_configs = load_tv_configs(config)
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid TVS configuration: {e}")
+    
+    if not tv_configs and not config['network_discovery']:
+        raise ValueError("TV_IP (or TVS, or NETWORK_DISCOVERY) environment variable is required!")
+    
+    names = [tv['name'] for tv in tv_configs]
+    if len(set(names)) != len(names) or 'bridge' in names:
+        raise ValueError("TV names must be unique and cannot be 'bridge'")
+    if config['mqtt_protocol'] not in ('3.1.1', '5'):
+        raise ValueError("MQTT_PROTOCOL must be 3.1.1 or 5")
+    if config['mqtt_shared_group'] and config['network_discovery']:
+        # Members would each drive the TVs they found, and drop commands for the others
+        raise ValueError("MQTT_SHARED_GROUP cannot be combined with NETWORK_DISCOVERY")
+    return tv_configs
+
+# ============================================================================
+# JSON CODEC
+# ============================================================================
+
+# Fastest available backend; json_dumps always returns compact UTF-8 bytes
+try:
+    import orjson
+
+    JSON_BACKEND = 'orjson'
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    try:
+        import ujson
+
+        JSON_BACKEND = 'ujson'
+        json_loads = ujson.loads
+
+        def json_dumps(obj: Any) -> bytes:
+            return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+    except ImportError:
+        JSON_BACKEND = 'json'
+        json_loads = json.loads
+        _json_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+        def json_dumps(obj: Any) -> bytes:
+            return _json_encoder.encode(obj).encode('utf-8')
+
+logger.debug("JSON backend: %s", JSON_BACKEND)
+
+# Fixed request frames, serialised once
+HANDSHAKE_FRAME = json_dumps({"action": "handshake", "type": "request"})
+STATE_REQUEST_FRAME = json_dumps({"action": "state", "type": "request"})
+SUBSCRIBE_FRAME = json_dumps({
+    "action": "subscribe", "type": "request",
+    "events": ["state", "volumechange", "sourceswitch", "app", "powerchange"],
+})
+
+KEY_FRAME_PATTERN = re.compile(r'KEY_[A-Z0-9_]+')
+KEY_FRAME_CACHE_SIZE = 256
+_key_frames: Dict[str, bytes] = {}
+
+
+def key_frame(keycode: str) -> bytes:
+    """Serialised sendkey request, cached for well-formed key codes"""
+    frame = _key_frames.get(keycode)
+    if frame is None:
+        frame = json_dumps({"action": "sendkey", "type": "request", "keycode": keycode})
+        if KEY_FRAME_PATTERN.fullmatch(keycode) and len(_key_frames) < KEY_FRAME_CACHE_SIZE:
+            _key_frames[keycode] = frame
+    return frame
+
+
+for _keycode in (
+    'KEY_POWER', 'KEY_VOLUMEUP', 'KEY_VOLUMEDOWN', 'KEY_MUTE',
+    'KEY_CHANNELUP', 'KEY_CHANNELDOWN', 'KEY_UP', 'KEY_DOWN', 'KEY_LEFT',
+    'KEY_RIGHT', 'KEY_OK', 'KEY_BACK', 'KEY_HOME', 'KEY_MENU',
+):
+    key_frame(_keycode)
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+class Metric:
+    """Base class: one metric family with a fixed set of label names"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: str = '') -> str:
+        pairs = [
+            '{}="{}"'.format(
+                name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            )
+            for name, value in zip(self.labelnames, key)
+        ]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{self._format_labels(key)} {value}"
+                for key, value in self._values.items()
+            ]
+
+    def expose(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ] + self.samples()
+
+
+class Counter(Metric):
+    """Monotonic counter"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Point-in-time value. Either set explicitly, or computed at scrape time
+    by `collect` returning {label values tuple: value}.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> List[str]:
+        if self.collect:
+            with self._lock:
+                self._values = dict(self.collect())
+        return super().samples()
+
+
+class Histogram(Metric):
+    """Cumulative histogram with fixed buckets (seconds)"""
+
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                       0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket in zip(self.buckets, counts):
+                    cumulative += bucket
+                    labels = self._format_labels(key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = self._format_labels(key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric and renders the Prometheus text exposition"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def expose(self) -> bytes:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.expose())
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+METRICS = MetricsRegistry()
+
+WS_MESSAGES = METRICS.register(Counter(
+    'hisense_ws_messages_total', 'Websocket frames exchanged with TVs', ('tv', 'direction')))
+WS_BYTES = METRICS.register(Counter(
+    'hisense_ws_bytes_total', 'Websocket payload bytes exchanged with TVs', ('tv', 'direction')))
+MESSAGE_DECODE_SECONDS = METRICS.register(Histogram(
+    'hisense_message_decode_seconds', 'Time spent parsing/decrypting inbound frames', ('tv', 'kind')))
+NOTIFICATIONS = METRICS.register(Counter(
+    'hisense_notifications_total', 'Unsolicited notifications pushed by TVs', ('tv', 'event')))
+COMMAND_SECONDS = METRICS.register(Histogram(
+    'hisense_command_seconds', 'Time spent executing an MQTT command', ('tv', 'command')))
+COMMAND_RTT_SECONDS = METRICS.register(Histogram(
+    'hisense_command_rtt_seconds', 'Command to TV acknowledgement round trip', ('tv',)))
+CONNECT_ATTEMPTS = METRICS.register(Counter(
+    'hisense_connect_attempts_total', 'TV connection attempts', ('tv', 'result')))
+DEAD_CONNECTIONS = METRICS.register(Counter(
+    'hisense_ws_dead_connections_total', 'Connections dropped after missing the liveness deadline', ('tv',)))
+CONNECT_SECONDS = METRICS.register(Histogram(
+    'hisense_connect_seconds', 'Duration of TV connection attempts', ('tv',)))
+MQTT_PUBLISHES = METRICS.register(Counter(
+    'hisense_mqtt_publish_total', 'MQTT messages published', ('kind',)))
+MQTT_DROPPED = METRICS.register(Counter(
+    'hisense_mqtt_dropped_total', 'Outbound MQTT messages dropped or superseded', ('kind', 'reason')))
+MQTT_PUBLISHES_SKIPPED = METRICS.register(Counter(
+    'hisense_mqtt_publish_skipped_total', 'Unchanged retained publishes skipped', ('kind',)))
+COMMANDS_QUEUED = METRICS.register(Counter(
+    'hisense_commands_total', 'MQTT commands received, by queue outcome', ('tv', 'outcome')))
+
+
+class MetricsServer:
+    """Serves METRICS on http://<host>:<port>/metrics from a daemon thread"""
+
+    def __init__(self, port: int, host: str = '0.0.0.0'):
+        self.port = port
+        self.host = host
+        self._server = None
+
+    def start(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = METRICS.expose()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        Thread(target=self._server.serve_forever, name='metrics', daemon=True).start()
+        logger.info(f"📈 Metrics available on http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+# ============================================================================
+# PAYLOAD CIPHER
+# ============================================================================
+
+# Encrypted frames are plain base64 text
+BASE64_FRAME = re.compile(r'[A-Za-z0-9+/]+={0,2}')
+
+
+class PayloadCipher:
+    """
+    AES-128-CBC decryption of Vidaa-U encrypted frames.
+    The AES key schedule is built once per key (an ECB context, created
+    with the cipher when the keys change) and CBC chaining is one XOR of
+    big integers, so no cipher object is created per message. Decryption
+    writes into a reusable buffer owned by the connection.
+    """
+
+    BLOCK = 16
+
+    def __init__(self, key: bytes, iv: bytes):
+        # Crypto is only imported once a TV connection needs a cipher
+        from Crypto.Cipher import AES
+        self.key = key
+        self.iv = iv
+        self._ecb = AES.new(key, AES.MODE_ECB)
+        self._buffer = bytearray(4096)
+
+    def decrypt(self, data: bytes) -> Optional[bytes]:
+        """Decrypt and unpad, None if the data is not a valid ciphertext"""
+        size = len(data)
+        if not size or size % self.BLOCK:
+            return None
+        if size > len(self._buffer):
+            self._buffer = bytearray(size)
+        out = memoryview(self._buffer)[:size]
+        self._ecb.decrypt(data, output=out)
+        
+        # CBC: plaintext = D(c[i]) xor c[i-1], with c[-1] = iv
+        chain = int.from_bytes(self.iv, 'big') << (8 * (size - self.BLOCK))
+        chain |= int.from_bytes(data[:-self.BLOCK], 'big')
+        plain = (int.from_bytes(out, 'big') ^ chain).to_bytes(size, 'big')
+        
+        padding = plain[-1]
+        if not 1 <= padding <= self.BLOCK or plain[-padding:] != bytes([padding]) * padding:
+            return None
+        return plain[:-padding]
+
+# ============================================================================
+# SNAPSHOT STORE
+# ============================================================================
+
+class SnapshotStore:
+    """
+    Last known state, cipher material and working (port, ssl) endpoint per
+    TV (keyed by name@ip, several TVs may share an IP behind NAT or in tests),
+    persisted as one JSON file for warm starts. Updates only mark the store
+    dirty; a flusher thread writes it atomically every FLUSH_INTERVAL seconds.
+    """
+
+    FLUSH_INTERVAL = 5
+
+    def __init__(self, path: Optional[str], legacy_endpoints_path: Optional[str] = None):
+        self.path = path
+        self._lock = Lock()
+        self._dirty = False
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+        self._records: Dict[str, Dict[str, Any]] = self._load(path) or {}
+        if not self._records and legacy_endpoints_path:
+            # endpoints.json from earlier versions: {key: {port, ssl}}
+            endpoints = self._load(legacy_endpoints_path) or {}
+            self._records = {key: {'endpoint': entry} for key, entry in endpoints.items()}
+
+    @staticmethod
+    def _load(path: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not path:
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable snapshot {path}: {e}")
+        return None
+
+    def get(self, key: str) -> Dict[str, Any]:
+        """Snapshot record of a TV (state, cipher, endpoint), empty if unknown"""
+        with self._lock:
+            return dict(self._records.get(key, {}))
+
+    def endpoint(self, key: str) -> Optional[Tuple[int, bool]]:
+        """Return the last working (port, ssl) for a TV, if any"""
+        entry = self.get(key).get('endpoint')
+        if entry:
+            return int(entry['port']), bool(entry['ssl'])
+        return None
+
+    def update(self, key: str, **fields):
+        """Replace fields of a TV record; written by the next flush"""
+        with self._lock:
+            record = self._records.setdefault(key, {})
+            if all(record.get(name) == value for name, value in fields.items()):
+                return
+            record.update(fields)
+            self._dirty = True
+
+    def flush(self):
+        """Write the snapshot atomically if anything changed"""
+        with self._lock:
+            if not self._dirty or not self.path:
+                return
+            data = json.dumps(self._records)
+            self._dirty = False
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.debug(f"Could not persist snapshot: {e}")
+
+    def start(self):
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name='snapshot', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(2)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.FLUSH_INTERVAL):
+            self.flush()
+
+# ============================================================================
+# TV STATE
+# ============================================================================
+
+TV_STATE_FIELDS = ('power', 'volume', 'muted', 'source', 'channel', 'app')
+
+
+class StateSnapshot(NamedTuple):
+    """Immutable view of a TVState at one version"""
+    version: int
+    power: str
+    volume: int
+    muted: bool
+    source: Optional[str]
+    channel: Any
+    app: Optional[str]
+
+    def fields(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in TV_STATE_FIELDS}
 
-logger.info(f"✅ Configuration loaded - TV IP: {CONFIG['tv_ip']}:{CONFIG['tv_port']}")
+
+class TVState:
+    """
+    Last known state of one TV. Writers go through update(), which bumps
+    the version only when a field really changes and returns the change
+    set; readers take snapshot(), an immutable tuple built once per version,
+    so publishers can skip TVs whose version has not moved.
+    """
+
+    __slots__ = TV_STATE_FIELDS + ('version', '_lock', '_snapshot')
+
+    def __init__(self):
+        self.power = 'OFF'
+        self.volume = 0
+        self.muted = False
+        self.source: Optional[str] = None
+        self.channel = None
+        self.app: Optional[str] = None
+        self.version = 0
+        self._lock = Lock()
+        self._snapshot: Optional[StateSnapshot] = None
+
+    def update(self, **fields) -> Dict[str, Any]:
+        """Apply field values, returns {field: new value} for the ones that changed"""
+        with self._lock:
+            changes = {name: value for name, value in fields.items() if getattr(self, name) != value}
+            if changes:
+                for name, value in changes.items():
+                    setattr(self, name, value)
+                self.version += 1
+                self._snapshot = None
+        return changes
+
+    def snapshot(self) -> StateSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = StateSnapshot(self.version, *(getattr(self, name) for name in TV_STATE_FIELDS))
+                snapshot = self._snapshot
+        return snapshot
+
+    def as_dict(self) -> Dict[str, Any]:
+        return self.snapshot().fields()
+
+    def __repr__(self) -> str:
+        return repr(self.as_dict())
 
 # ============================================================================
 # HISENSE TV CLASS
@@ -79,186 +700,373 @@ class HisenseTV:
     - Automatic handshake and authentication
     """
 
-    def __init__(self, ip: str, port: int = 10001, use_ssl: bool = False):
+    # Candidate (port, ssl) pairs tried after the configured one
+    FALLBACK_ENDPOINTS = [
+        (10001, False),              # Standard Vidaa-U
+        (36669, False),              # Legacy port
+        (36670, False),              # Alternative legacy
+        (36870, True),               # SSL port
+    ]
+
+    # Input sources and menu directions -> key codes
+    SOURCE_KEYS = {
+        'HDMI1': 'KEY_HDMI1',
+        'HDMI2': 'KEY_HDMI2',
+        'HDMI3': 'KEY_HDMI3',
+        'HDMI4': 'KEY_HDMI4',
+        'TV': 'KEY_TV',
+        'AV': 'KEY_AV',
+        'DTMB': 'KEY_DTMB',
+        'IPTV': 'KEY_IPTV'
+    }
+    NAVIGATION_KEYS = {
+        'UP': 'KEY_UP',
+        'DOWN': 'KEY_DOWN',
+        'LEFT': 'KEY_LEFT',
+        'RIGHT': 'KEY_RIGHT',
+        'OK': 'KEY_OK',
+        'BACK': 'KEY_BACK',
+        'HOME': 'KEY_HOME',
+        'MENU': 'KEY_MENU'
+    }
+
+    # Unsolicited notification action -> fields it carries (TV key -> state key);
+    # 'state' notifications carry a full or partial state frame
+    NOTIFICATION_FIELDS = {
+        'volumechange': {'volume_value': 'volume', 'volume': 'volume', 'mute': 'mute'},
+        'sourceswitch': {'sourceid': 'sourceid', 'sourcename': 'source'},
+        'app': {'name': 'app', 'app': 'app'},
+        'powerchange': {'power': 'power'},
+    }
+
+    def __init__(self, ip: str, port: int = 10001, use_ssl: bool = False,
+                 name: str = 'tv', snapshot: Optional[SnapshotStore] = None,
+                 mac: str = ''):
+        self.name = name
+        self.mac = mac
+        self.snapshot = snapshot
+        # Set by restore() when a warm start found a snapshot
+        self.restored = False
+        self.cipher_restored = False
+        self.logger = logger.getChild(name)
         self.ip = ip
         self.port = port
         self.use_ssl = use_ssl
         self.ws: Optional[websocket.WebSocketApp] = None
         self.ws_thread: Optional[Thread] = None
         self.connected = False
+        self.last_seen: Optional[float] = None
+        self.state_received = False
+        # Keepalive: websocket pings (0 disables) and last frame of any kind, pongs included
+        self.ping_interval = 10
+        self.ping_timeout = 5
+        self.last_frame = 0.0
+        self._last_keepalive = 0.0
+        # Ask for pushed notifications after the handshake; subscribed once acked
+        self.subscribe = True
+        self.subscribed = False
+        self.connect_timeout = 5
+        self.probe_timeout = 2
+        self.handshake_timeout = 2
+        
+        # Connection lifecycle events (set by websocket callbacks)
+        self.ready = Event()
+        self._attempt_done = Event()
+        
+        # Requests waiting for the next ack/state frame from the TV
+        self._pending: List[Tuple[float, Future]] = []
+        self._pending_lock = Lock()
+        
+        # Called from the websocket thread after each state update
+        self.on_state_update: Optional[Callable[['HisenseTV'], None]] = None
+        # Called once when an established connection is lost
+        self.on_disconnect: Optional[Callable[['HisenseTV'], None]] = None
         
         # Encryption keys (Vidaa-U default)
         self.cipher_key = b'0000000000000000'
         self.cipher_iv = b'0000000000000000'
+        self.cipher = PayloadCipher(self.cipher_key, self.cipher_iv)
         
         # State
-        self.state = {
-            'power': 'OFF',
-            'volume': 0,
-            'muted': False,
-            'source': None,
-            'channel': None,
-            'app': None
-        }
+        self.state = TVState()
+
+    @property
+    def endpoint_key(self) -> str:
+        """Identity of this TV in the endpoint cache"""
+        return f"{self.name}@{self.ip}"
+
+    def _candidate_endpoints(self) -> List[Tuple[int, bool]]:
+        """Ordered, de-duplicated (port, ssl) candidates, cached winner first"""
+        candidates = []
+        if self.snapshot:
+            cached = self.snapshot.endpoint(self.endpoint_key)
+            if cached:
+                candidates.append(cached)
+        candidates.append((self.port, self.use_ssl))  # Primary configured port
+        candidates.extend(self.FALLBACK_ENDPOINTS)
+        
+        # Remove duplicates while preserving order
+        seen = set()
+        unique = []
+        for endpoint in candidates:
+            if endpoint not in seen:
+                seen.add(endpoint)
+                unique.append(endpoint)
+        return unique
+
+    def _probe_endpoints(self, candidates: List[Tuple[int, bool]]) -> List[Tuple[int, bool]]:
+        """
+        Cheap TCP pre-check before attempting a websocket upgrade: every
+        candidate port is probed at once with non-blocking connects, the
+        reachable endpoints are returned in candidate (preference) order.
+        """
+        ports = list(dict.fromkeys(port for port, _ in candidates))
+        reachable = tcp_probe(((port, self.ip, port) for port in ports), self.probe_timeout)
+        return [endpoint for endpoint in candidates if reachable.get(endpoint[0])]
 
     def connect(self) -> bool:
         """
         Connect to TV via WebSocket with automatic port discovery.
-        Tests multiple ports and protocols if primary fails.
+        All candidate ports are TCP-probed in parallel and the websocket
+        upgrade is attempted on reachable ones, cached endpoint first.
+        The winning endpoint is remembered in the endpoint cache.
         """
-        ports_to_try = [
-            (self.port, self.use_ssl),  # Primary configured port
-            (10001, False),              # Standard Vidaa-U
-            (36669, False),              # Legacy port
-            (36670, False),              # Alternative legacy
-            (36870, True),               # SSL port
-        ]
+        started = time.monotonic()
+        attempted = False
+        for port, use_ssl in self._probe_endpoints(self._candidate_endpoints()):
+            attempted = True
+            if self._connect_endpoint(port, use_ssl):
+                if self.snapshot:
+                    self.snapshot.update(self.endpoint_key, endpoint={'port': port, 'ssl': use_ssl})
+                CONNECT_ATTEMPTS.inc(tv=self.name, result='success')
+                CONNECT_SECONDS.observe(time.monotonic() - started, tv=self.name)
+                return True
         
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_ports = []
-        for port, use_ssl in ports_to_try:
-            key = (port, use_ssl)
-            if key not in seen:
-                seen.add(key)
-                unique_ports.append((port, use_ssl))
+        CONNECT_ATTEMPTS.inc(tv=self.name, result='failure')
+        CONNECT_SECONDS.observe(time.monotonic() - started, tv=self.name)
+        if not attempted:
+            self.logger.warning(f"⏱️ No Vidaa-U port reachable on {self.ip}")
+        else:
+            self.logger.error("❌ Failed to connect to TV on any port")
+        return False
+
+    def _connect_endpoint(self, port: int, use_ssl: bool) -> bool:
+        """Open the websocket on one endpoint and wait for the handshake"""
+        protocol = "wss" if use_ssl else "ws"
+        url = f"{protocol}://{self.ip}:{port}"
         
-        for port, use_ssl in unique_ports:
-            protocol = "wss" if use_ssl else "ws"
-            url = f"{protocol}://{self.ip}:{port}"
+        try:
+            self.logger.info(f"📡 Attempting connection: {url}")
             
-            try:
-                logger.info(f"📡 Attempting connection: {url}")
-                
-                self.ws = websocket.WebSocketApp(
-                    url,
-                    on_open=self._on_open,
-                    on_message=self._on_message,
-                    on_error=self._on_error,
-                    on_close=self._on_close
-                )
-                
-                run_kwargs = {}
-                if use_ssl:
-                    run_kwargs['sslopt'] = {
-                        "cert_reqs": ssl.CERT_NONE,
-                        "check_hostname": False,
-                        "ssl_version": ssl.PROTOCOL_TLSv1_2
-                    }
-                
-                self.ws_thread = Thread(
-                    target=self.ws.run_forever,
-                    kwargs=run_kwargs,
-                    daemon=True
-                )
-                self.ws_thread.start()
-                
-                # Wait for connection
-                timeout = 5
-                start = time.time()
-                while not self.connected and (time.time() - start) < timeout:
-                    time.sleep(0.1)
+            self._attempt_done.clear()
+            self.ready.clear()
+            self.subscribed = False
+            self.ws = websocket.WebSocketApp(
+                url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close,
+                on_pong=self._on_pong
+            )
+            
+            run_kwargs = {}
+            if self.ping_interval:
+                # websocket-client requires the pong timeout below the interval
+                run_kwargs['ping_interval'] = self.ping_interval
+                run_kwargs['ping_timeout'] = min(self.ping_timeout or self.ping_interval / 2,
+                                                 self.ping_interval / 2)
+            if use_ssl:
+                run_kwargs['sslopt'] = {
+                    "cert_reqs": ssl.CERT_NONE,
+                    "check_hostname": False,
+                    "ssl_version": ssl.PROTOCOL_TLSv1_2
+                }
+            
+            self.ws_thread = Thread(
+                target=self.ws.run_forever,
+                kwargs=run_kwargs,
+                daemon=True
+            )
+            self.ws_thread.start()
+            
+            # Wait for the socket to open, fail or time out
+            self._attempt_done.wait(self.connect_timeout)
+            
+            if self.connected:
+                self.logger.info(f"✅ Connected to {url}")
+                self.port = port
+                self.use_ssl = use_ssl
+                if self.cipher_restored:
+                    pass  # Keys known from the snapshot, the handshake completes in the background
+                elif not self.ready.wait(self.handshake_timeout):
+                    self.logger.warning("⏱️ No handshake response, continuing without it")
+                return True
+            
+            self.logger.warning(f"⏱️ Connection failed or timed out on {url}")
+            if self.ws:
+                self.ws.close()
+            if self.ws_thread:
+                self.ws_thread.join(1)
                 
-                if self.connected:
-                    logger.info(f"✅ Connected to {url}")
-                    self.port = port
-                    self.use_ssl = use_ssl
-                    return True
-                else:
-                    logger.warning(f"⏱️ Connection timeout on {url}")
-                    if self.ws:
-                        self.ws.close()
-                    time.sleep(1)
-                    
-            except Exception as e:
-                logger.warning(f"❌ Failed on {port}: {e}")
-                if self.ws:
-                    try:
-                        self.ws.close()
-                    except:
-                        pass
-                time.sleep(1)
-        
-        logger.error("❌ Failed to connect to TV on any port")
+        except Exception as e:
+            self.logger.warning(f"❌ Failed on {port}: {e}")
+            if self.ws:
+                try:
+                    self.ws.close()
+                except:
+                    pass
         return False
 
     def _on_open(self, ws):
         """WebSocket connection opened"""
-        logger.info("🔌 WebSocket connection established")
+        if ws is not self.ws:
+            return  # Callback from a superseded connection attempt
+        self.logger.info("🔌 WebSocket connection established")
+        self.last_frame = time.monotonic()
         self.connected = True
+        self._attempt_done.set()
         self._authenticate()
 
-    def _on_message(self, ws, message: str):
+    def _on_message(self, ws, message: Any):
         """Handle incoming WebSocket message"""
+        self.last_seen = time.time()
+        self.last_frame = time.monotonic()
         try:
-            logger.debug(f"📨 Message received: {message[:200]}")
+            if should_trace(self.logger, 'ws_in'):
+                self.logger.debug("📨 Message received: %.200s", message)
+            WS_MESSAGES.inc(tv=self.name, direction='in')
+            WS_BYTES.inc(len(message), tv=self.name, direction='in')
             
-            # Try to parse as JSON
-            try:
-                data = json.loads(message)
+            if isinstance(message, (bytes, bytearray)):
+                message = bytes(message).decode('utf-8', 'replace')
+            
+            # Classify on the first character before choosing a decode path,
+            # frames neither fast path takes get the lenient decode
+            started = time.perf_counter()
+            data = None
+            if message.lstrip()[:1] in ('{', '['):
+                kind = 'json'
+                try:
+                    data = json_loads(message)
+                except ValueError:
+                    self.logger.debug("Ignoring malformed JSON frame: %.100s", message)
+            elif BASE64_FRAME.fullmatch(message):
+                kind = 'encrypted'
+                data = self._try_decrypt_message(message)
+            else:
+                kind = 'lenient'
+                data = self._decode_lenient(message)
+            MESSAGE_DECODE_SECONDS.observe(time.perf_counter() - started, tv=self.name, kind=kind)
+            
+            if isinstance(data, dict):
                 self._process_message(data)
-            except json.JSONDecodeError:
-                # Try to decrypt if it looks like base64/encrypted
-                self._try_decrypt_message(message)
+            elif isinstance(data, list):
+                for item in data:
+                    if isinstance(item, dict):
+                        self._process_message(item)
+            else:
+                self.logger.debug("Ignoring frame that is neither JSON nor encrypted JSON")
                 
         except Exception as e:
-            logger.error(f"❌ Error processing message: {e}")
+            self.logger.error(f"❌ Error processing message: {e}")
+
+    def _on_pong(self, ws, data):
+        """Websocket-level keepalive answered"""
+        if ws is self.ws:
+            self.last_frame = time.monotonic()
 
     def _on_error(self, ws, error):
         """WebSocket error occurred"""
-        logger.error(f"❌ WebSocket error: {error}")
-        self.connected = False
+        if ws is not self.ws:
+            return  # Callback from a superseded connection attempt
+        self.logger.error(f"❌ WebSocket error: {error}")
+        self._connection_lost()
 
     def _on_close(self, ws, close_status_code, close_msg):
         """WebSocket connection closed"""
-        logger.warning(f"🔴 Connection closed: {close_status_code} - {close_msg}")
+        if ws is not self.ws:
+            return  # Callback from a superseded connection attempt
+        self.logger.warning(f"🔴 Connection closed: {close_status_code} - {close_msg}")
+        self._connection_lost()
+
+    def _connection_lost(self):
+        """Mark the connection down, notify once if it was established"""
+        was_connected = self.connected
         self.connected = False
+        self.subscribed = False
+        self.ready.clear()
+        self._attempt_done.set()
+        if was_connected and self.on_disconnect:
+            self.on_disconnect(self)
+
+    def keepalive(self, liveness_timeout: float) -> bool:
+        """
+        Application-level heartbeat, called periodically while connected.
+        Requests the state once the TV has been quiet for half the liveness
+        timeout; drops the connection (notifying on_disconnect) and returns
+        False when no frame at all arrived within it.
+        """
+        if not self.connected or not liveness_timeout:
+            return True
+        now = time.monotonic()
+        quiet = now - self.last_frame
+        if quiet >= liveness_timeout:
+            self.logger.warning(f"💀 No frame from the TV for {quiet:.0f}s, dropping the connection")
+            DEAD_CONNECTIONS.inc(tv=self.name)
+            ws = self.ws
+            self._connection_lost()
+            if ws:
+                try:
+                    ws.close(timeout=0)
+                except Exception:
+                    pass
+            return False
+        if quiet >= liveness_timeout / 2 and now - self._last_keepalive >= liveness_timeout / 2:
+            self._last_keepalive = now
+            self._request_state()
+        return True
 
     def _authenticate(self):
         """Perform handshake/authentication with TV"""
         try:
             # Initial handshake message
-            handshake = {
-                "action": "handshake",
-                "type": "request"
-            }
-            self._send_command(handshake)
-            logger.info("🔐 Handshake sent")
-        except Exception as e:
-            logger.error(f"❌ Authentication error: {e}")
-
-    def _encrypt_payload(self, payload: str) -> Optional[str]:
-        """Encrypt payload using AES-128-CBC"""
-        try:
-            cipher = AES.new(self.cipher_key, AES.MODE_CBC, self.cipher_iv)
-            padded = pad(payload.encode('utf-8'), AES.block_size)
-            encrypted = cipher.encrypt(padded)
-            return base64.b64encode(encrypted).decode('utf-8')
+            self._send_frame(HANDSHAKE_FRAME)
+            self.logger.info("🔐 Handshake sent")
         except Exception as e:
-            logger.error(f"❌ Encryption error: {e}")
-            return None
+            self.logger.error(f"❌ Authentication error: {e}")
 
     def _decrypt_payload(self, encrypted_payload: str) -> Optional[str]:
         """Decrypt payload using AES-128-CBC"""
         try:
-            cipher = AES.new(self.cipher_key, AES.MODE_CBC, self.cipher_iv)
-            decoded = base64.b64decode(encrypted_payload)
-            decrypted = cipher.decrypt(decoded)
-            unpadded = unpad(decrypted, AES.block_size)
-            return unpadded.decode('utf-8')
+            decrypted = self.cipher.decrypt(binascii.a2b_base64(encrypted_payload))
+            if decrypted is None:
+                self.logger.debug("Decryption failed: invalid length or padding")
+                return None
+            return decrypted.decode('utf-8')
         except Exception as e:
-            logger.debug(f"Decryption failed (may not be encrypted): {e}")
+            self.logger.debug("Decryption failed (may not be encrypted): %s", e)
             return None
 
-    def _try_decrypt_message(self, message: str):
-        """Attempt to decrypt encrypted message"""
+    def _try_decrypt_message(self, message: str) -> Optional[Dict[str, Any]]:
+        """Attempt to decrypt and parse an encrypted message"""
         decrypted = self._decrypt_payload(message)
         if decrypted:
             try:
-                data = json.loads(decrypted)
-                self._process_message(data)
-            except json.JSONDecodeError:
-                logger.debug(f"Decrypted message is not JSON: {decrypted[:100]}")
+                return json_loads(decrypted)
+            except ValueError:
+                self.logger.debug("Decrypted message is not JSON: %.100s", decrypted)
+        return None
+
+    def _decode_lenient(self, message: str) -> Optional[Any]:
+        """
+        Slow path for frames that are neither JSON nor plain base64: an
+        encrypted frame wrapped over several lines or padded with spaces
+        (a2b_base64 skips characters outside the alphabet)
+        """
+        if not message.strip():
+            return None
+        return self._try_decrypt_message(message)
 
     def _process_message(self, data: Dict[str, Any]):
         """Process received JSON message"""
@@ -266,14 +1074,31 @@ class HisenseTV:
             action = data.get('action', '').lower()
             msg_type = data.get('type', '').lower()
             
-            logger.debug(f"📋 Processing action={action}, type={msg_type}")
+            if should_trace(self.logger, 'ws_process'):
+                self.logger.debug("📋 Processing action=%s, type=%s", action, msg_type)
+            
+            # Pushed by the TV on its own, never the answer to a request
+            if msg_type == 'notify':
+                self._process_notification(action, data)
+                return
+            
+            if action == 'subscribe' and msg_type == 'response':
+                self.subscribed = True
+                self.logger.info("🔔 Subscribed to TV notifications")
+                return
+            
+            if msg_type == 'response' or action == 'state' or 'power' in data:
+                self._resolve_pending(data)
             
             # Handshake response
             if action == 'handshake' and msg_type == 'response':
-                logger.info("✅ Handshake successful")
+                self.logger.info("✅ Handshake successful")
                 # Update encryption keys if provided
                 if 'cipher' in data:
                     self._update_cipher(data['cipher'])
+                self.ready.set()
+                if self.subscribe:
+                    self._send_frame(SUBSCRIBE_FRAME)
                 self._request_state()
                 
             # State update
@@ -281,22 +1106,112 @@ class HisenseTV:
                 self._update_state(data)
                 
         except Exception as e:
-            logger.error(f"❌ Error processing message: {e}")
+            self.logger.error(f"❌ Error processing message: {e}")
+
+    def _process_notification(self, action: str, data: Dict[str, Any]):
+        """Apply an unsolicited notification (remote press, app launch...)"""
+        if action == 'state':
+            fields = data
+        else:
+            mapping = self.NOTIFICATION_FIELDS.get(action)
+            if mapping is None:
+                self.logger.debug("Ignoring notification: %s", action)
+                return
+            fields = {key: data[tv_key] for tv_key, key in mapping.items() if tv_key in data}
+        NOTIFICATIONS.inc(tv=self.name, event=action)
+        if fields:
+            # A partial notification does not make the whole state known
+            self._update_state(fields, complete=action == 'state' and 'power' in data)
 
-    def _update_state(self, data: Dict[str, Any]):
+    def _update_state(self, data: Dict[str, Any], complete: bool = True):
         """Update local state from received data"""
+        if complete:
+            self.state_received = True
+        fields = {}
         if 'power' in data:
-            self.state['power'] = 'ON' if data.get('power') else 'OFF'
+            fields['power'] = 'ON' if data.get('power') else 'OFF'
         if 'volume' in data:
-            self.state['volume'] = data.get('volume', 0)
+            fields['volume'] = data.get('volume', 0)
         if 'mute' in data or 'muted' in data:
-            self.state['muted'] = data.get('mute') or data.get('muted', False)
+            fields['muted'] = data.get('mute') or data.get('muted', False)
         if 'sourceid' in data or 'source' in data:
-            self.state['source'] = data.get('sourceid') or data.get('source')
+            fields['source'] = data.get('sourceid') or data.get('source')
         if 'channel' in data:
-            self.state['channel'] = data.get('channel')
+            fields['channel'] = data.get('channel')
+        if 'app' in data:
+            fields['app'] = data.get('app')
+        changes = self.set_state(**fields)
+        
+        if should_trace(self.logger, 'state'):
+            self.logger.debug("State updated: %s, changed: %s", self.state, changes)
         
-        logger.debug(f"State updated: {self.state}")
+        if self.on_state_update:
+            self.on_state_update(self)
+
+    def set_state(self, **fields) -> Dict[str, Any]:
+        """
+        Change state fields, from the TV or deduced by the bridge. Changes
+        are recorded in the snapshot; returns them
+        """
+        changes = self.state.update(**fields)
+        if changes and self.snapshot:
+            self.snapshot.update(self.endpoint_key, state=self.state.as_dict())
+        return changes
+
+    def expect_response(self) -> Future:
+        """
+        Register interest in the TV's answer to the next command.
+        The future resolves with the next ack or state frame received, which
+        on a single ordered socket is the reply to everything sent before it.
+        """
+        future = Future()
+        with self._pending_lock:
+            self._pending.append((time.monotonic(), future))
+        return future
+
+    def cancel_response(self, future: Future):
+        """Withdraw a registration whose command sent nothing"""
+        with self._pending_lock:
+            self._pending = [item for item in self._pending if item[1] is not future]
+        future.cancel()
+
+    def _resolve_pending(self, data: Dict[str, Any]):
+        """Complete every outstanding request with the received frame"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        for _, future in pending:
+            if not future.done():
+                future.set_result(data)
+
+    def expire_pending(self, max_age: float):
+        """Fail requests the TV has not answered within max_age seconds"""
+        now = time.monotonic()
+        with self._pending_lock:
+            expired = [item for item in self._pending if now - item[0] >= max_age]
+            self._pending = [item for item in self._pending if now - item[0] < max_age]
+        for _, future in expired:
+            if not future.done():
+                future.set_exception(TimeoutError("no response from TV"))
+
+    def restore(self) -> bool:
+        """Warm start: last known state and cipher keys from the snapshot"""
+        record = self.snapshot.get(self.endpoint_key) if self.snapshot else {}
+        state = record.get('state')
+        if state:
+            self.state.update(**{name: state[name] for name in TV_STATE_FIELDS if name in state})
+            self.restored = True
+        cipher = record.get('cipher')
+        if cipher:
+            try:
+                self.cipher_key = base64.b64decode(cipher['key'])
+                self.cipher_iv = base64.b64decode(cipher['iv'])
+                self.cipher = PayloadCipher(self.cipher_key, self.cipher_iv)
+                self.cipher_restored = True
+            except (KeyError, ValueError) as e:
+                self.logger.warning(f"Ignoring snapshot cipher keys: {e}")
+        if self.restored:
+            self.logger.info(f"♻️ Restored last known state: {self.state}")
+        return self.restored
 
     def _update_cipher(self, cipher_data: Dict[str, Any]):
         """Update encryption keys from TV response"""
@@ -305,50 +1220,65 @@ class HisenseTV:
                 self.cipher_key = base64.b64decode(cipher_data['key'])
             if 'iv' in cipher_data:
                 self.cipher_iv = base64.b64decode(cipher_data['iv'])
-            logger.info("🔑 Encryption keys updated")
+            self.cipher = PayloadCipher(self.cipher_key, self.cipher_iv)
+            self.logger.info("🔑 Encryption keys updated")
+            if self.snapshot:
+                self.snapshot.update(self.endpoint_key, cipher={
+                    'key': base64.b64encode(self.cipher_key).decode('ascii'),
+                    'iv': base64.b64encode(self.cipher_iv).decode('ascii'),
+                })
         except Exception as e:
-            logger.warning(f"Failed to update cipher keys: {e}")
+            self.logger.warning(f"Failed to update cipher keys: {e}")
 
     def _request_state(self):
         """Request current state from TV"""
-        command = {
-            "action": "state",
-            "type": "request"
-        }
-        self._send_command(command)
+        self._send_frame(STATE_REQUEST_FRAME)
 
     def _send_command(self, command: Dict[str, Any]) -> bool:
         """Send command to TV"""
+        return self._send_frame(json_dumps(command))
+
+    def _send_frame(self, frame: bytes) -> bool:
+        """Send an already serialised command frame to TV"""
         if not self.connected or not self.ws:
-            logger.warning("⚠️ TV not connected, cannot send command")
+            self.logger.warning("⚠️ TV not connected, cannot send command")
             return False
         
         try:
-            message = json.dumps(command)
-            logger.debug(f"📤 Sending command: {message}")
-            self.ws.send(message)
+            if should_trace(self.logger, 'ws_out'):
+                self.logger.debug("📤 Sending command: %s", frame)
+            self.ws.send(frame)
+            WS_MESSAGES.inc(tv=self.name, direction='out')
+            WS_BYTES.inc(len(frame), tv=self.name, direction='out')
             return True
         except Exception as e:
-            logger.error(f"❌ Error sending command: {e}")
+            self.logger.error(f"❌ Error sending command: {e}")
             return False
 
     def send_key(self, keycode: str) -> bool:
         """Send IR key to TV"""
-        command = {
-            "action": "sendkey",
-            "type": "request",
-            "keycode": keycode
-        }
-        return self._send_command(command)
+        return self._send_frame(key_frame(keycode))
 
-    def power_on(self) -> bool:
-        """Turn TV on"""
+    def power_on(self) -> Optional[bool]:
+        """Turn TV on (KEY_POWER toggles, so skip it if already on: None, nothing sent)"""
+        if self.state_received and self.state.power == 'ON':
+            return None
         return self.send_key("KEY_POWER")
 
-    def power_off(self) -> bool:
-        """Turn TV off"""
+    def power_off(self) -> Optional[bool]:
+        """Turn TV off (KEY_POWER toggles, so skip it if already off: None, nothing sent)"""
+        if self.state_received and self.state.power == 'OFF':
+            return None
         return self.send_key("KEY_POWER")
 
+    def wake(self, broadcast: str = '255.255.255.255') -> bool:
+        """Wake the TV with a Wake-on-LAN magic packet (works while the socket is down)"""
+        if not self.mac:
+            self.logger.warning("⚠️ No MAC address configured, cannot send Wake-on-LAN")
+            return False
+        self.logger.info(f"⏰ Sending Wake-on-LAN to {self.mac}")
+        return send_wake_on_lan(self.mac, broadcast)
+
     def volume_up(self) -> bool:
         """Increase volume"""
         return self.send_key("KEY_VOLUMEUP")
@@ -360,7 +1290,7 @@ class HisenseTV:
     def set_volume(self, level: int) -> bool:
         """Set volume to specific level (0-100)"""
         if not 0 <= level <= 100:
-            logger.warning(f"⚠️ Volume level out of range: {level}")
+            self.logger.warning(f"⚠️ Volume level out of range: {level}")
             return False
         command = {
             "action": "setvolume",
@@ -384,7 +1314,7 @@ class HisenseTV:
     def set_channel(self, channel: int) -> bool:
         """Set channel to specific number"""
         if channel < 0:
-            logger.warning(f"⚠️ Invalid channel number: {channel}")
+            self.logger.warning(f"⚠️ Invalid channel number: {channel}")
             return False
         command = {
             "action": "setchannel",
@@ -395,100 +1325,1510 @@ class HisenseTV:
 
     def set_source(self, source: str) -> bool:
         """Change input source"""
-        source_map = {
-            'HDMI1': 'KEY_HDMI1',
-            'HDMI2': 'KEY_HDMI2',
-            'HDMI3': 'KEY_HDMI3',
-            'HDMI4': 'KEY_HDMI4',
-            'TV': 'KEY_TV',
-            'AV': 'KEY_AV',
-            'DTMB': 'KEY_DTMB',
-            'IPTV': 'KEY_IPTV'
-        }
-        
-        key = source_map.get(source.upper())
+        key = self.SOURCE_KEYS.get(source.upper())
         if key:
             return self.send_key(key)
         else:
-            logger.warning(f"⚠️ Unknown source: {source}")
+            self.logger.warning(f"⚠️ Unknown source: {source}")
             return False
 
     def navigate(self, direction: str) -> bool:
         """Navigate menu"""
-        direction_map = {
-            'UP': 'KEY_UP',
-            'DOWN': 'KEY_DOWN',
-            'LEFT': 'KEY_LEFT',
-            'RIGHT': 'KEY_RIGHT',
-            'OK': 'KEY_OK',
-            'BACK': 'KEY_BACK',
-            'HOME': 'KEY_HOME',
-            'MENU': 'KEY_MENU'
-        }
-        
-        key = direction_map.get(direction.upper())
+        key = self.NAVIGATION_KEYS.get(direction.upper())
         if key:
             return self.send_key(key)
         else:
-            logger.warning(f"⚠️ Unknown direction: {direction}")
+            self.logger.warning(f"⚠️ Unknown direction: {direction}")
             return False
 
     def disconnect(self):
-        """Disconnect from TV"""
+        """Disconnect from TV and tear down the websocket thread"""
         self.connected = False
-        if self.ws:
+        self.subscribed = False
+        self.ready.clear()
+        self.expire_pending(0)
+        # Detach first so callbacks of the closing socket are ignored
+        ws, self.ws = self.ws, None
+        if ws:
             try:
-                self.ws.close()
+                ws.close()
             except:
                 pass
-        logger.info("✅ TV disconnected")
+        if self.ws_thread and self.ws_thread.is_alive():
+            self.ws_thread.join(2)
+        self.ws_thread = None
+        self.logger.info("✅ TV disconnected")
 
 
 # ============================================================================
-# MQTT BRIDGE CLASS
+# COMMAND REGISTRY
 # ============================================================================
 
-class MQTTBridge:
-    """Manages MQTT to Hisense TV bridge"""
+# True/False whether the command frame went out, None when the known
+# state made it unnecessary
+Action = Callable[[HisenseTV], Optional[bool]]
 
-    def __init__(self, config: Dict[str, Any]):
-        self.config = config
-        self.mqtt_client: Optional[mqtt.Client] = None
-        self.tv: Optional[HisenseTV] = None
-        self.running = False
-        
-        # Calculate topic base
-        self.base_topic = f"{config['mqtt_topic_prefix']}/{config['tv_name']}"
-        self.command_topic = f"{self.base_topic}/command"
-        self.state_topic = f"{self.base_topic}/state"
-        self.availability_topic = f"{self.base_topic}/availability"
 
-    def setup_mqtt(self) -> bool:
-        """Initialize MQTT client"""
-        try:
-            self.mqtt_client = mqtt.Client(
-                client_id=f"hisense_tv_{self.config['tv_name']}"
-            )
-            
-            if self.config['mqtt_user'] and self.config['mqtt_password']:
-                self.mqtt_client.username_pw_set(
-                    self.config['mqtt_user'],
-                    self.config['mqtt_password']
-                )
-            
+def _variants(mapping: Dict[str, Action]) -> Dict[str, Action]:
+    """Index fixed payloads under their usual spellings, so lookup is one dict get"""
+    indexed: Dict[str, Action] = {}
+    for payload, action in mapping.items():
+        for variant in (payload, payload.lower(), payload.upper(), payload.capitalize()):
+            indexed.setdefault(variant, action)
+    return indexed
+
+
+def _key_action(keycode: str) -> Action:
+    """Send a key with its frame serialised once"""
+    frame = key_frame(keycode)
+    return lambda tv: tv._send_frame(frame)
+
+
+def _int_range(low: int, high: int) -> Callable[[str], Optional[int]]:
+    def parse(payload: str) -> Optional[int]:
+        if payload.isdigit() and low <= int(payload) <= high:
+            return int(payload)
+        return None
+    return parse
+
+
+def _toggle_power(tv: HisenseTV) -> Optional[bool]:
+    return tv.power_off() if tv.state.power == 'ON' else tv.power_on()
+
+
+def _set_mute(wanted: bool) -> Action:
+    """KEY_MUTE toggles: skip it when the known state already matches"""
+    def action(tv: HisenseTV) -> Optional[bool]:
+        if tv.state_received and bool(tv.state.muted) == wanted:
+            return None
+        return tv.mute()
+    return action
+
+
+class Command:
+    """
+    One command topic suffix: fixed payloads map straight to an action,
+    other payloads go through `parse` (None = invalid) and then `handler`.
+    """
+
+    __slots__ = ('fixed', 'parse', 'handler')
+
+    def __init__(self, fixed: Optional[Dict[str, Action]] = None,
+                 parse: Optional[Callable[[str], Any]] = None,
+                 handler: Optional[Callable[[HisenseTV, Any], Any]] = None):
+        self.fixed = _variants(fixed or {})
+        self.parse = parse
+        self.handler = handler
+
+    def resolve(self, payload: str) -> Optional[Action]:
+        """The action for a payload, None if the payload is invalid"""
+        action = self.fixed.get(payload)
+        if action is None and self.fixed:
+            action = self.fixed.get(payload.lower())
+        if action is None and self.parse:
+            value = self.parse(payload)
+            if value is not None:
+                handler = self.handler
+                action = lambda tv: handler(tv, value)
+        return action
+
+
+# Topic suffix under <prefix>/<tv_name>/command/ -> command
+COMMAND_REGISTRY: Dict[str, Command] = {
+    'power': Command({
+        'on': HisenseTV.power_on,
+        'off': HisenseTV.power_off,
+        'toggle': _toggle_power,
+    }),
+    'volume': Command(
+        {'up': _key_action('KEY_VOLUMEUP'), 'down': _key_action('KEY_VOLUMEDOWN')},
+        _int_range(0, 100), HisenseTV.set_volume),
+    'mute': Command(
+        {'on': _set_mute(True), 'off': _set_mute(False)},
+        lambda payload: True, lambda tv, _: tv.mute()),
+    'source': Command({
+        source: _key_action(keycode) for source, keycode in HisenseTV.SOURCE_KEYS.items()
+    }),
+    'channel': Command(
+        {'up': _key_action('KEY_CHANNELUP'), 'down': _key_action('KEY_CHANNELDOWN')},
+        _int_range(0, 99999), HisenseTV.set_channel),
+    'navigate': Command({
+        direction: _key_action(keycode) for direction, keycode in HisenseTV.NAVIGATION_KEYS.items()
+    }),
+    'key': Command(parse=lambda payload: payload or None, handler=HisenseTV.send_key),
+}
+
+# ============================================================================
+# COMMAND QUEUE
+# ============================================================================
+
+class CommandReply(NamedTuple):
+    """MQTT v5 request/response: where to acknowledge a command"""
+    topic: str
+    correlation: bytes
+
+
+class QueuedCommand:
+    """One pending MQTT command, possibly the merge of several"""
+
+    __slots__ = ('command', 'payload', 'volume_delta', 'replies')
+
+    def __init__(self, command: str, payload: str):
+        self.command = command
+        self.payload = payload
+        self.volume_delta = 0
+        # Requesters of every merged command
+        self.replies: List[CommandReply] = []
+
+
+class CommandQueue:
+    """
+    Bounded per-TV command queue drained by a dedicated sender thread.
+    - Rate limited to `rate` commands per second toward the TV
+    - Redundant commands are coalesced while they wait:
+      volume up/down steps accumulate into one relative change, an absolute
+      volume/source/power on|off/channel number supersedes the queued one.
+      Only the latest queued command of the same kind is merged into, and
+      only when every command queued after it is independent of it, so
+      e.g. [channel 5, channel up] + channel 7 queues a third command
+    - When full, new commands are dropped and counted
+    """
+
+    # Commands where only the latest absolute value matters
+    SUPERSEDING = ('source',)
+    # Commands that may sit after a queued one without depending on it
+    INDEPENDENT: Dict[str, Tuple[str, ...]] = {
+        'volume': ('channel', 'source', 'navigate'),
+        'channel': ('volume', 'mute'),
+        'source': ('volume', 'mute'),
+        'power': (),
+    }
+
+    def __init__(self, name: str, execute: Callable[[QueuedCommand], None],
+                 rate: float = 10, maxsize: int = 32):
+        self.name = name
+        self.execute = execute
+        self.min_interval = 1.0 / rate if rate > 0 else 0
+        self.maxsize = maxsize
+        self._queue: deque = deque()
+        self._cond = Condition()
+        self._running = False
+        self._thread: Optional[Thread] = None
+        
+        # Counters
+        self.enqueued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.sent = 0
+
+    def _find(self, command: str) -> Optional[QueuedCommand]:
+        """Latest queued command of this kind, None if a later one depends on it"""
+        independent = self.INDEPENDENT.get(command, ())
+        for queued in reversed(self._queue):
+            if queued.command == command:
+                return queued
+            if queued.command not in independent:
+                return None
+        return None
+
+    def _coalesce(self, command: str, payload: str) -> Optional[QueuedCommand]:
+        """Merge into a queued command when possible, returns the merged one"""
+        payload_lower = payload.lower()
+        
+        if command == 'volume':
+            queued = self._find('volume')
+            if queued is None:
+                return None
+            if payload_lower in ('up', 'down'):
+                step = 1 if payload_lower == 'up' else -1
+                if queued.payload.isdigit():
+                    queued.payload = str(min(100, max(0, int(queued.payload) + step)))
+                else:
+                    queued.volume_delta += step
+            elif payload.isdigit():
+                queued.payload = payload
+                queued.volume_delta = 0
+            else:
+                return None
+            return queued
+        
+        if command == 'power' and payload_lower in ('on', 'off'):
+            queued = self._find('power')
+            if queued is None:
+                return None
+            queued.payload = payload
+            return queued
+        
+        if command == 'channel' and payload.isdigit():
+            queued = self._find('channel')
+            if queued is None or not queued.payload.isdigit():
+                return None
+            queued.payload = payload
+            return queued
+        
+        if command in self.SUPERSEDING:
+            queued = self._find(command)
+            if queued is None:
+                return None
+            queued.payload = payload
+            return queued
+        
+        return None
+
+    def put(self, command: str, payload: str, reply: Optional[CommandReply] = None) -> bool:
+        """Queue a command without blocking, returns False if it was dropped"""
+        with self._cond:
+            self.enqueued += 1
+            merged = self._coalesce(command, payload)
+            if merged is not None:
+                if reply:
+                    merged.replies.append(reply)
+                self.coalesced += 1
+                COMMANDS_QUEUED.inc(tv=self.name, outcome='coalesced')
+                return True
+            if len(self._queue) >= self.maxsize:
+                self.dropped += 1
+                COMMANDS_QUEUED.inc(tv=self.name, outcome='dropped')
+                logger.warning(f"⚠️ Command queue full for {self.name}, dropping {command}")
+                return False
+            queued = QueuedCommand(command, payload)
+            if command == 'volume' and payload.lower() in ('up', 'down'):
+                queued.volume_delta = 1 if payload.lower() == 'up' else -1
+            if reply:
+                queued.replies.append(reply)
+            self._queue.append(queued)
+            COMMANDS_QUEUED.inc(tv=self.name, outcome='queued')
+            self._cond.notify()
+            return True
+
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'depth': len(self._queue),
+            'enqueued': self.enqueued,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'sent': self.sent,
+        }
+
+    def start(self):
+        self._running = True
+        self._thread = Thread(target=self._run, name=f"commands-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def _run(self):
+        next_allowed = 0.0
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._running:
+                    return
+            
+            # Rate limit: later commands keep coalescing while we wait
+            delay = next_allowed - time.monotonic()
+            if delay > 0:
+                with self._cond:
+                    self._cond.wait_for(lambda: not self._running, delay)
+                    if not self._running:
+                        return
+            
+            with self._cond:
+                queued = self._queue.popleft()
+            try:
+                self.execute(queued)
+                self.sent += 1
+            except Exception as e:
+                logger.error(f"❌ Command execution error ({self.name}): {e}")
+            next_allowed = time.monotonic() + self.min_interval
+
+# ============================================================================
+# POWER DETECTION
+# ============================================================================
+
+def send_wake_on_lan(mac: str, broadcast: str = '255.255.255.255', port: int = 9) -> bool:
+    """Send a Wake-on-LAN magic packet to a MAC address"""
+    digits = re.sub(r'[^0-9A-Fa-f]', '', mac)
+    if len(digits) != 12:
+        logger.warning(f"⚠️ Invalid MAC address for Wake-on-LAN: {mac}")
+        return False
+    packet = b'\xff' * 6 + bytes.fromhex(digits) * 16
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sock.sendto(packet, (broadcast, port))
+        return True
+    except OSError as e:
+        logger.error(f"❌ Wake-on-LAN error: {e}")
+        return False
+
+
+def tcp_probe(targets: Iterable[Tuple[Any, str, int]], timeout: float = 1,
+              batch: int = 256) -> Dict[Any, bool]:
+    """
+    Non-blocking TCP connects to many (key, ip, port) targets at once,
+    returns {key: reachable}. At most `batch` sockets are open at a time
+    and each batch waits on one selector for up to `timeout` seconds.
+    """
+    results: Dict[Any, bool] = {}
+    targets = list(targets)
+    for offset in range(0, len(targets), batch):
+        with selectors.DefaultSelector() as selector:
+            for key, ip, port in targets[offset:offset + batch]:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                error = sock.connect_ex((ip, port))
+                if error in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                    selector.register(sock, selectors.EVENT_WRITE, key)
+                else:
+                    results[key] = False
+                    sock.close()
+            
+            deadline = time.monotonic() + timeout
+            while selector.get_map():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                for selected, _ in selector.select(remaining):
+                    sock = selected.fileobj
+                    results[selected.data] = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+                    selector.unregister(sock)
+                    sock.close()
+            for selected in list(selector.get_map().values()):
+                results[selected.data] = False
+                selected.fileobj.close()
+    return results
+
+
+class PowerProber:
+    """
+    Detects sleeping TVs waking up without holding a websocket open.
+    A single thread sweeps every offline TV with a non-blocking TCP connect
+    to its last known port, all probes of a sweep running at once.
+    """
+
+    def __init__(self, targets: Callable[[], List[Tuple[str, str, int]]],
+                 on_result: Callable[[str, bool], None],
+                 interval: float = 5, timeout: float = 1):
+        self.targets = targets
+        self.on_result = on_result
+        self.interval = interval
+        self.timeout = timeout
+        self._stop = Event()
+
+    def start(self):
+        Thread(target=self._run, name='power-prober', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def sweep(self) -> Dict[str, bool]:
+        """Probe all current targets once, returns {name: reachable}"""
+        return tcp_probe(self.targets(), self.timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                for name, reachable in self.sweep().items():
+                    self.on_result(name, reachable)
+            except Exception as e:
+                logger.error(f"❌ Power probe error: {e}")
+
+# ============================================================================
+# NETWORK DISCOVERY
+# ============================================================================
+
+SSDP_ADDRESS = ('239.255.255.250', 1900)
+MDNS_ADDRESS = ('224.0.0.251', 5353)
+# Found in SSDP SERVER/USN headers and mDNS names of Hisense TVs
+VIDAA_SIGNATURE = re.compile(rb'hisense|vidaa', re.IGNORECASE)
+
+
+def normalize_mac(mac: str) -> str:
+    """aa:bb:cc:dd:ee:ff form of a MAC address, '' if it is not one"""
+    digits = re.sub(r'[^0-9a-f]', '', (mac or '').lower())
+    if len(digits) != 12:
+        return ''
+    return ':'.join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+def read_arp_table() -> Dict[str, str]:
+    """IP -> MAC from the kernel neighbour table (Linux only)"""
+    table = {}
+    try:
+        with open('/proc/net/arp') as f:
+            next(f, None)
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 4 and normalize_mac(fields[3]) not in ('', '00:00:00:00:00:00'):
+                    table[fields[0]] = normalize_mac(fields[3])
+    except OSError:
+        pass
+    return table
+
+
+def _multicast_query(request: bytes, address: Tuple[str, int],
+                     timeout: float) -> Iterator[Tuple[str, bytes]]:
+    """Send one multicast datagram, yield (ip, reply) until timeout"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    try:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        sock.sendto(request, address)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            sock.settimeout(remaining)
+            try:
+                data, (ip, _) = sock.recvfrom(9000)
+            except socket.timeout:
+                return
+            yield ip, data
+    except OSError as e:
+        logger.debug(f"Multicast query to {address[0]} failed: {e}")
+    finally:
+        sock.close()
+
+
+def ssdp_search(timeout: float = 2) -> Dict[str, Tuple[str, bool]]:
+    """
+    IP -> (device UUID or '', Hisense/VIDAA named in a reply) of every
+    UPnP device answering an M-SEARCH
+    """
+    request = (
+        'M-SEARCH * HTTP/1.1\r\n'
+        f'HOST: {SSDP_ADDRESS[0]}:{SSDP_ADDRESS[1]}\r\n'
+        'MAN: "ssdp:discover"\r\n'
+        'MX: 1\r\n'
+        'ST: ssdp:all\r\n\r\n'
+    ).encode()
+    found: Dict[str, Tuple[str, bool]] = {}
+    for ip, data in _multicast_query(request, SSDP_ADDRESS, timeout):
+        uuid, vidaa = found.get(ip, ('', False))
+        match = re.search(rb'uuid:([0-9A-Fa-f-]{8,})', data)
+        if match:
+            uuid = match.group(1).decode().lower()
+        found[ip] = (uuid, vidaa or bool(VIDAA_SIGNATURE.search(data)))
+    return found
+
+
+def mdns_query(timeout: float = 2) -> Dict[str, bool]:
+    """
+    IP -> Hisense/VIDAA named in a reply, for every mDNS responder to a
+    DNS-SD service enumeration.
+    Sent from an ephemeral port, responders answer by unicast (RFC 6762
+    legacy unicast), so no multicast group membership is needed.
+    """
+    name = b''.join(bytes([len(label)]) + label.encode()
+                    for label in '_services._dns-sd._udp.local'.split('.')) + b'\0'
+    # id 0, standard query, one question: PTR, class IN with the unicast-response bit
+    request = struct.pack('!6H', 0, 0, 1, 0, 0, 0) + name + struct.pack('!2H', 12, 0x8001)
+    found: Dict[str, bool] = {}
+    for ip, data in _multicast_query(request, MDNS_ADDRESS, timeout):
+        found[ip] = found.get(ip, False) or bool(VIDAA_SIGNATURE.search(data))
+    return found
+
+
+def vidaa_handshake(ip: str, port: int, use_ssl: bool, timeout: float = 2) -> bool:
+    """Whether a Vidaa-U websocket on ip:port answers the handshake request"""
+    url = f"{'wss' if use_ssl else 'ws'}://{ip}:{port}"
+    sslopt = {"cert_reqs": ssl.CERT_NONE, "check_hostname": False} if use_ssl else None
+    deadline = time.monotonic() + timeout
+    try:
+        ws = websocket.create_connection(url, timeout=timeout, sslopt=sslopt)
+    except Exception:
+        return False
+    try:
+        ws.send(HANDSHAKE_FRAME)
+        while time.monotonic() < deadline:
+            ws.settimeout(max(0.05, deadline - time.monotonic()))
+            try:
+                data = json_loads(ws.recv())
+            except ValueError:
+                continue  # Encrypted push or other frame, wait for the answer
+            if isinstance(data, dict) and str(data.get('action', '')).lower() == 'handshake':
+                return True
+    except Exception:
+        pass
+    finally:
+        ws.close()
+    return False
+
+
+class NetworkScanner:
+    """
+    Finds Vidaa-U TVs on the LAN. SSDP and mDNS responders, every host of
+    the configured CIDR ranges and the TVs already known are TCP-probed on
+    the Vidaa ports; multicast listening and the CIDR sweep run concurrently.
+    An open port alone only makes a candidate: a host is confirmed as a TV
+    when its SSDP/mDNS replies name Hisense/VIDAA or it answers the Vidaa
+    websocket handshake, and stays confirmed afterwards. Hosts are kept
+    in an inventory keyed by MAC (device UUID, then IP, when the MAC is
+    unknown), cached on disk and handed to on_result after every scan.
+    """
+
+    # Seconds to collect SSDP/mDNS replies
+    LISTEN = 2
+    # Largest range swept, in hosts (a /22)
+    MAX_HOSTS = 1024
+
+    def __init__(self, cidrs: str, cache_path: Optional[str],
+                 on_result: Callable[[List[Dict[str, Any]]], None],
+                 interval: float = 600, timeout: float = 1):
+        self.cache_path = cache_path
+        self.on_result = on_result
+        self.interval = interval
+        self.timeout = timeout
+        self.networks = []
+        for cidr in filter(None, (part.strip() for part in cidrs.split(','))):
+            try:
+                network = ipaddress.ip_network(cidr, strict=False)
+            except ValueError as e:
+                logger.warning(f"⚠️ Ignoring invalid network_scan_cidr entry {cidr!r}: {e}")
+                continue
+            if network.version != 4 or network.num_addresses > self.MAX_HOSTS:
+                logger.warning(f"⚠️ Ignoring {cidr}: only IPv4 ranges up to {self.MAX_HOSTS} hosts are swept")
+                continue
+            self.networks.append(network)
+        self._lock = Lock()
+        self._stop = Event()
+        self.inventory: Dict[str, Dict[str, Any]] = {}
+        if cache_path:
+            try:
+                with open(cache_path) as f:
+                    self.inventory = json.load(f)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Ignoring unreadable TV inventory: {e}")
+
+    @staticmethod
+    def inventory_key(record: Dict[str, Any]) -> str:
+        if record.get('mac'):
+            return record['mac']
+        if record.get('uuid'):
+            return f"uuid:{record['uuid']}"
+        return f"ip:{record['ip']}"
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Copy of the inventory"""
+        with self._lock:
+            return [dict(record) for record in self.inventory.values()]
+
+    def _cidr_hosts(self) -> List[str]:
+        hosts = []
+        for network in self.networks:
+            # A /32 has no "hosts" beyond the address itself
+            hosts.extend(str(host) for host in (network.hosts() if network.num_addresses > 2 else network))
+        return hosts
+
+    def _probe(self, hosts: Iterable[str]) -> Dict[str, Tuple[int, bool]]:
+        """IP -> first Vidaa (port, ssl) answering, for the hosts that answer at all"""
+        endpoints = HisenseTV.FALLBACK_ENDPOINTS
+        targets = [((ip, index), ip, port) for ip in hosts for index, (port, _) in enumerate(endpoints)]
+        found: Dict[str, Tuple[int, bool]] = {}
+        for (ip, index), reachable in sorted(tcp_probe(targets, self.timeout).items()):
+            if reachable and ip not in found:
+                found[ip] = endpoints[index]
+        return found
+
+    def scan(self) -> List[Dict[str, Any]]:
+        """One discovery pass, returns the records of the hosts that answered"""
+        started = time.monotonic()
+        with self._lock:
+            known = {record['ip'] for record in self.inventory.values()}
+        swept_hosts = set(self._cidr_hosts()) | known
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix='scan') as pool:
+            ssdp = pool.submit(ssdp_search, self.LISTEN)
+            mdns = pool.submit(mdns_query, self.LISTEN)
+            swept = pool.submit(self._probe, swept_hosts)
+            ssdp_replies = ssdp.result()
+            mdns_replies = mdns.result()
+            multicast = (set(ssdp_replies) | set(mdns_replies)) - swept_hosts
+            found = swept.result()
+        # Multicast-only responders are few: probe them after the listen window
+        found.update(self._probe(multicast))
+        
+        with self._lock:
+            confirmed = {record['ip'] for record in self.inventory.values() if record.get('confirmed')}
+        for ip, (port, use_ssl) in found.items():
+            if ssdp_replies.get(ip, ('', False))[1] or mdns_replies.get(ip):
+                confirmed.add(ip)
+            elif ip not in confirmed and vidaa_handshake(ip, port, use_ssl, self.timeout * 2):
+                confirmed.add(ip)
+        
+        arp = read_arp_table()
+        now = int(time.time())
+        results = []
+        with self._lock:
+            for ip, (port, use_ssl) in found.items():
+                record = {
+                    'ip': ip,
+                    'port': port,
+                    'ssl': use_ssl,
+                    'mac': arp.get(ip, ''),
+                    'uuid': ssdp_replies.get(ip, ('', False))[0],
+                    'confirmed': ip in confirmed,
+                    'last_seen': now,
+                }
+                for key, old in list(self.inventory.items()):
+                    if old['ip'] != ip or (old.get('mac') and record['mac'] and old['mac'] != record['mac']):
+                        continue
+                    # Same TV: keep identifiers learnt earlier, drop records under weaker keys
+                    record['mac'] = record['mac'] or old.get('mac', '')
+                    record['uuid'] = record['uuid'] or old.get('uuid', '')
+                    if key != self.inventory_key(record):
+                        del self.inventory[key]
+                self.inventory[self.inventory_key(record)] = record
+                results.append(dict(record))
+        self._save()
+        tvs = sum(1 for record in results if record['confirmed'])
+        logger.info(f"🔎 Network scan: {tvs} TV(s) and {len(results) - tvs} unconfirmed candidate(s) "
+                    f"found in {time.monotonic() - started:.1f}s")
+        return results
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        with self._lock:
+            data = json.dumps(self.inventory)
+        try:
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save TV inventory: {e}")
+
+    def start(self):
+        self._stop.clear()
+        Thread(target=self._run, name='network-scan', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.on_result(self.scan())
+            except Exception as e:
+                logger.error(f"❌ Network scan error: {e}")
+            self._stop.wait(self.interval)
+
+# ============================================================================
+# RECONNECT SUPERVISOR
+# ============================================================================
+
+class ReconnectSupervisor:
+    """
+    Schedules TV (re)connections with exponential backoff and jitter.
+    - The first retry after a drop happens quickly (fast path)
+    - Later retries double the delay up to max_delay; each delay is
+      randomised so TVs dropping together do not reconnect in lockstep
+    - At most `concurrency` attempts run at once, and one per TV
+    """
+
+    def __init__(self, connect: Callable[[str], bool],
+                 on_result: Callable[[str, bool], None],
+                 first_delay: float = 0.5, base_delay: float = 2.0,
+                 max_delay: float = 300, concurrency: int = 4):
+        self.connect = connect
+        self.on_result = on_result
+        self.first_delay = first_delay
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempts: Dict[str, int] = {}
+        self._scheduled: Dict[str, float] = {}
+        self._in_flight: set = set()
+        self._cancelled: set = set()
+        self._heap: List[Tuple[float, str]] = []
+        self._cond = Condition()
+        self._running = False
+        self._pool = ThreadPoolExecutor(max_workers=max(1, concurrency),
+                                        thread_name_prefix='reconnect')
+
+    def next_delay(self, name: str) -> float:
+        """Delay before the next attempt for a TV, with jitter"""
+        attempts = self.attempts.get(name, 0)
+        if attempts == 0:
+            return random.uniform(0, self.first_delay)
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def schedule(self, name: str, delay: Optional[float] = None, reset: bool = False):
+        """
+        Queue a connection attempt unless one is running or an earlier one
+        is already pending. `reset` restarts the backoff (e.g. TV woke up).
+        """
+        with self._cond:
+            if name in self._in_flight:
+                return
+            if reset:
+                self.attempts.pop(name, None)
+            if delay is None:
+                delay = self.next_delay(name)
+            due = time.monotonic() + delay
+            if self._scheduled.get(name, float('inf')) <= due:
+                return
+            self._scheduled[name] = due
+            heapq.heappush(self._heap, (due, name))
+            self._cond.notify()
+        logger.debug("Reconnect of %s scheduled in %.1fs", name, delay)
+
+    def connecting(self, name: str) -> bool:
+        """An attempt for this TV is running"""
+        with self._cond:
+            return name in self._in_flight
+
+    def cancel(self, name: str):
+        """Drop the pending attempt; a running one is not retried if it fails"""
+        with self._cond:
+            self._scheduled.pop(name, None)
+            self.attempts.pop(name, None)
+            if name in self._in_flight:
+                self._cancelled.add(name)
+
+    def start(self):
+        self._running = True
+        Thread(target=self._run, name='reconnect-supervisor', daemon=True).start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    if self._heap:
+                        due, name = self._heap[0]
+                        if self._scheduled.get(name) != due:
+                            heapq.heappop(self._heap)  # Cancelled or superseded
+                            continue
+                        wait = due - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                if not self._running:
+                    return
+                heapq.heappop(self._heap)
+                del self._scheduled[name]
+                self._in_flight.add(name)
+            self._pool.submit(self._attempt, name)
+
+    def _attempt(self, name: str):
+        try:
+            success = self.connect(name)
+        except Exception as e:
+            logger.error(f"❌ Reconnect error ({name}): {e}")
+            success = False
+        with self._cond:
+            self._in_flight.discard(name)
+            cancelled = name in self._cancelled
+            self._cancelled.discard(name)
+            if success:
+                self.attempts.pop(name, None)
+            elif not cancelled:
+                self.attempts[name] = self.attempts.get(name, 0) + 1
+        self.on_result(name, success)
+        if not success and not cancelled and self._running:
+            self.schedule(name)
+
+# ============================================================================
+# MQTT PUBLISH PIPELINE
+# ============================================================================
+
+class PublishPipeline:
+    """
+    Outbound MQTT stage shared by every publisher of the bridge.
+    QoS and retain come from the topic class. While the broker is
+    disconnected or slow (max_inflight unacknowledged QoS 1 messages),
+    retained messages wait in a bounded buffer keyed by topic: only the
+    latest value per topic survives and a reconnect flushes that minimal
+    set. Volatile QoS 0 messages are dropped while disconnected.
+    Under MQTT v5, volatile kinds carry a message expiry and hot topics are
+    sent by topic alias once the broker knows them.
+    """
+
+    # Topic class -> (qos, retain)
+    TOPIC_CLASSES = {
+        'state': (1, True),
+        'availability': (1, True),
+        'discovery': (1, True),
+        'heartbeat': (0, False),
+        'telemetry': (0, False),
+    }
+    # Topic classes published by alias under MQTT v5
+    ALIASED = ('state',)
+
+    def __init__(self, maxsize: int = 1000, max_inflight: int = 20,
+                 expiry: Optional[Dict[str, int]] = None):
+        self.maxsize = maxsize
+        self.max_inflight = max_inflight
+        # Topic class -> MQTT v5 message expiry interval in seconds
+        self.expiry = expiry if expiry is not None else {}
+        self.client: Optional[mqtt.Client] = None
+        self.mqtt5 = False
+        self.connected = False
+        self._buffer: 'OrderedDict[str, Tuple[Any, str]]' = OrderedDict()
+        # (info, topic, (alias, payload) when sent by alias only)
+        self._inflight: List[Tuple[mqtt.MQTTMessageInfo, str, Optional[Tuple[int, Any]]]] = []
+        # Topics paho redelivers from the previous session: newer values wait for their ack
+        self._held: Set[str] = set()
+        self._lock = Lock()
+        
+        # MQTT v5 topic aliases of the current connection, bounded by the broker's maximum
+        self.alias_maximum = 0
+        self._aliases: Dict[str, int] = {}
+        self._next_alias = 1
+        # Topics whose first aliased message is not queued in paho yet
+        self._mapping: Set[str] = set()
+        # v5 sends in progress; a reconnect pauses new ones while it rebuilds the aliases
+        self._sending = 0
+        self._paused = False
+        self._send_cond = Condition()
+        
+        # Buffered messages are sent from this thread when acks free capacity,
+        # never from paho's on_publish (called with paho's message lock held)
+        self._drain = Event()
+        self._drainer: Optional[Thread] = None
+
+    def attach(self, client: mqtt.Client, mqtt5: bool = False):
+        if client is not self.client:
+            # Messages in flight on a replaced client are never acked; the
+            # bridge republishes its retained state on the next connect
+            with self._lock:
+                self._inflight = []
+                self._held = set()
+        self.client = client
+        self.mqtt5 = mqtt5
+        client.max_inflight_messages_set(self.max_inflight)
+        client.on_publish = self._on_publish
+        if self._drainer is None:
+            self._drainer = Thread(target=self._drain_loop, name='mqtt-drain', daemon=True)
+            self._drainer.start()
+
+    def depth(self) -> int:
+        return len(self._buffer)
+
+    def _has_capacity(self) -> bool:
+        """Room for another QoS 1 message (called with the lock held)"""
+        if len(self._inflight) >= self.max_inflight or self._held:
+            self._prune()
+        return len(self._inflight) < self.max_inflight
+
+    def _prune(self):
+        """Forget acknowledged messages (called with the lock held)"""
+        self._inflight = [item for item in self._inflight if not item[0].is_published()]
+        if self._held:
+            self._held = {item[1] for item in self._inflight if item[1] in self._held}
+
+    def _buffer_put(self, topic: str, payload: Any, kind: str):
+        """Keep the latest payload per topic (called with the lock held)"""
+        if topic in self._buffer:
+            MQTT_DROPPED.inc(kind=self._buffer[topic][1], reason='coalesced')
+        elif len(self._buffer) >= self.maxsize:
+            _, (_, dropped_kind) = self._buffer.popitem(last=False)
+            MQTT_DROPPED.inc(kind=dropped_kind, reason='overflow')
+        self._buffer[topic] = (payload, kind)
+
+    def publish(self, topic: str, payload: Any, kind: str,
+                properties: Optional[Properties] = None) -> bool:
+        """
+        Send now if the broker keeps up, otherwise buffer. True if sent.
+        MQTT v5 `properties` only go with messages sent right away
+        """
+        qos, retain = self.TOPIC_CLASSES[kind]
+        with self._lock:
+            if not retain:
+                if not self.connected:
+                    MQTT_DROPPED.inc(kind=kind, reason='offline')
+                    return False
+            else:
+                if self._held:
+                    self._prune()
+                if not self.connected or self._buffer or topic in self._held or not self._has_capacity():
+                    self._buffer_put(topic, payload, kind)
+                    return False
+        return self._dispatch(topic, payload, kind, properties)
+
+    def _dispatch(self, topic: str, payload: Any, kind: str,
+                    properties: Optional[Properties] = None) -> bool:
+        """_send, waiting while a reconnect rebuilds the MQTT v5 aliases"""
+        if not self.mqtt5:
+            return self._send(topic, payload, kind)
+        with self._send_cond:
+            self._send_cond.wait_for(lambda: not self._paused)
+            self._sending += 1
+        try:
+            return self._send(topic, payload, kind, properties)
+        finally:
+            with self._send_cond:
+                self._sending -= 1
+                self._send_cond.notify_all()
+
+    def _send(self, topic: str, payload: Any, kind: str,
+              properties: Optional[Properties] = None) -> bool:
+        qos, retain = self.TOPIC_CLASSES[kind]
+        aliased = None
+        if self.mqtt5:
+            info, aliased = self._publish_v5(topic, payload, kind, properties)
+        else:
+            info = self.client.publish(topic, payload, qos=qos, retain=retain)
+        if info.rc == mqtt.MQTT_ERR_NO_CONN and qos:
+            # paho keeps QoS 1 messages and sends them once reconnected:
+            # track it like any message in flight, its ack frees the slot
+            info.rc = mqtt.MQTT_ERR_SUCCESS
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            if retain:
+                with self._lock:
+                    if topic not in self._buffer:
+                        self._buffer_put(topic, payload, kind)
+            else:
+                MQTT_DROPPED.inc(kind=kind, reason='offline')
+            return False
+        MQTT_PUBLISHES.inc(kind=kind)
+        if qos:
+            with self._lock:
+                self._inflight.append((info, topic, aliased))
+        return True
+
+    def _alias(self, topic: str) -> Tuple[str, Optional[int]]:
+        """Topic name and alias a hot topic is published with (called with _send_cond held)"""
+        alias = self._aliases.get(topic)
+        if alias is None:
+            if self._next_alias > self.alias_maximum:
+                return topic, None
+            alias = self._aliases[topic] = self._next_alias
+            self._next_alias += 1
+            self._mapping.add(topic)
+        if topic in self._mapping:
+            # Until the mapping message is queued, the full topic goes along
+            return topic, alias
+        return '', alias
+
+    def _publish_v5(self, topic: str, payload: Any, kind: str, properties: Optional[Properties]
+                    ) -> Tuple[mqtt.MQTTMessageInfo, Optional[Tuple[int, Any]]]:
+        """
+        MQTT v5 publish. The first message on a hot topic maps it to an
+        alias, later ones send the 2-byte alias instead of the topic name.
+        Returns the message info and (alias, payload) for alias-only sends
+        """
+        qos, retain = self.TOPIC_CLASSES[kind]
+        if properties is None:
+            properties = Properties(PacketTypes.PUBLISH)
+        if self.expiry.get(kind):
+            properties.MessageExpiryInterval = self.expiry[kind]
+        if kind not in self.ALIASED:
+            return self.client.publish(topic, payload, qos=qos, retain=retain, properties=properties), None
+        
+        with self._send_cond:
+            name, alias = self._alias(topic)
+            maps = topic in self._mapping
+        if alias is not None:
+            properties.TopicAlias = alias
+        info = self.client.publish(name, payload, qos=qos, retain=retain, properties=properties)
+        if maps:
+            with self._send_cond:
+                self._mapping.discard(topic)
+                if info.rc not in (mqtt.MQTT_ERR_SUCCESS, mqtt.MQTT_ERR_NO_CONN):
+                    # Never queued: the next message maps a new alias
+                    self._aliases.pop(topic, None)
+        return info, ((alias, payload) if not name else None)
+
+    def _reset_aliases(self, alias_maximum: int, resent: List[Tuple[str, Tuple[int, Any]]]):
+        """
+        Aliases only live as long as a connection: start a new table. paho
+        resends unacked alias-only messages as they were queued, so the
+        aliases they use are mapped again first, by a full-topic message
+        on the same topic (v5 sends are paused meanwhile)
+        """
+        self._aliases = {}
+        self._mapping = set()
+        self.alias_maximum = alias_maximum
+        for topic, (alias, payload) in resent:
+            if self._aliases.get(topic) == alias:
+                continue
+            if alias > alias_maximum or alias in self._aliases.values():
+                logger.warning(f"⚠️ Topic alias {alias} of a resent message cannot be mapped again")
+                continue
+            self._aliases[topic] = alias
+            qos, retain = self.TOPIC_CLASSES['state']
+            properties = Properties(PacketTypes.PUBLISH)
+            properties.TopicAlias = alias
+            info = self.client.publish(topic, payload, qos=qos, retain=retain, properties=properties)
+            if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                with self._lock:
+                    self._inflight.append((info, topic, None))
+        self._next_alias = max(self._aliases.values(), default=0) + 1
+
+    def flush(self):
+        """Send buffered messages while the broker has capacity"""
+        while True:
+            with self._lock:
+                if not self.connected or not self._buffer or not self._has_capacity():
+                    return
+                topic = next((t for t in self._buffer if t not in self._held), None)
+                if topic is None:
+                    return
+                payload, kind = self._buffer.pop(topic)
+            if not self._dispatch(topic, payload, kind):
+                return
+
+    def _drain_loop(self):
+        while True:
+            self._drain.wait()
+            self._drain.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ MQTT buffer flush error: {e}")
+
+    def on_connect(self, alias_maximum: int = 0):
+        if self.mqtt5:
+            with self._send_cond:
+                self._paused = True
+                self._send_cond.wait_for(lambda: not self._sending)
+        try:
+            with self._lock:
+                self.connected = True
+                # paho redelivers unacked messages of the old session after this
+                # callback; newer values of those topics must not overtake them
+                self._prune()
+                self._held = {item[1] for item in self._inflight}
+                resent = [(item[1], item[2]) for item in self._inflight if item[2]]
+            if self.mqtt5:
+                self._reset_aliases(alias_maximum, resent)
+        finally:
+            if self.mqtt5:
+                with self._send_cond:
+                    self._paused = False
+                    self._send_cond.notify_all()
+        if self._buffer:
+            logger.info(f"📤 Flushing {len(self._buffer)} buffered MQTT message(s)")
+            self._drain.set()
+
+    def on_disconnect(self):
+        with self._lock:
+            self.connected = False
+
+    def _on_publish(self, client, userdata, mid):
+        """paho callback: an ack frees in-flight capacity and held topics"""
+        if self._buffer or self._held:
+            self._drain.set()
+
+# ============================================================================
+# HOME ASSISTANT DISCOVERY
+# ============================================================================
+
+DISCOVERY_PREFIX = 'homeassistant'
+
+_SWITCH = {'payload_on': 'on', 'payload_off': 'off'}
+
+# (component, object id, name suffix, config); topics are relative to "~",
+# the TV base topic <prefix>/<tv_name>
+DISCOVERY_ENTITIES: List[Tuple[str, str, str, Dict[str, Any]]] = [
+    ('media_player', '{tv}', '', {
+        'command_topic': '~/command/power', 'state_topic': '~/state/power',
+        **_SWITCH, 'state_on': 'ON', 'state_off': 'OFF', 'icon': 'mdi:television'}),
+    ('switch', '{tv}_power', 'Power', {
+        'command_topic': '~/command/power', 'state_topic': '~/state/power',
+        **_SWITCH, 'state_on': 'ON', 'state_off': 'OFF', 'icon': 'mdi:power'}),
+    ('sensor', '{tv}_volume', 'Volume', {
+        'state_topic': '~/state/volume', 'unit_of_measurement': '%', 'icon': 'mdi:volume-high'}),
+    ('switch', '{tv}_mute', 'Mute', {
+        'command_topic': '~/command/mute', 'state_topic': '~/state/muted',
+        **_SWITCH, 'state_on': 'True', 'state_off': 'False', 'icon': 'mdi:volume-off'}),
+    ('select', '{tv}_source', 'Source', {
+        'command_topic': '~/command/source', 'state_topic': '~/state/source',
+        'options': list(HisenseTV.SOURCE_KEYS), 'icon': 'mdi:video-input-hdmi'}),
+    ('number', '{tv}_channel', 'Channel', {
+        'command_topic': '~/command/channel', 'state_topic': '~/state/channel',
+        'min': 1, 'max': 9999, 'step': 1, 'mode': 'box', 'icon': 'mdi:numeric'}),
+] + [
+    ('button', f'{{tv}}_{direction.lower()}', direction.capitalize(), {
+        'command_topic': '~/command/navigate', 'payload_press': direction,
+        'icon': 'mdi:remote'})
+    for direction in HisenseTV.NAVIGATION_KEYS
+]
+
+
+class DiscoveryPublisher:
+    """
+    Publishes Home Assistant discovery configs, only the ones that changed.
+    Retained configs are read back from the broker and compared by hash,
+    publishes are paced, and configs the bridge published before but no
+    longer declares (removed TV or entity) are cleared.
+    """
+
+    # Discovery publishes per second
+    RATE = 20
+    # Seconds to collect retained configs after subscribing to them
+    READBACK_WAIT = 1.0
+
+    def __init__(self, prefix: str, bridge_availability_topic: str, cache_path: Optional[str],
+                 publish: Callable[[str, Any, str], bool]):
+        self.prefix = prefix
+        self.publish = publish
+        self.bridge_availability_topic = bridge_availability_topic
+        self.cache_path = cache_path
+        self._retained: Dict[str, str] = {}
+        self._lock = Lock()
+        self._busy = Lock()
+        self._pending = Event()
+        self._tv_names: List[str] = []
+        # Topics published by earlier runs, hash of their config
+        self.published: Dict[str, str] = {}
+        if cache_path:
+            try:
+                with open(cache_path) as f:
+                    self.published = json.load(f)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Ignoring unreadable discovery cache: {e}")
+
+    @staticmethod
+    def digest(payload: bytes) -> str:
+        return hashlib.sha1(payload).hexdigest()
+
+    def configs(self, tv_name: str) -> Dict[str, bytes]:
+        """Discovery topic -> serialised config for one TV"""
+        title = f"Hisense TV {tv_name.capitalize()}"
+        device = {
+            "identifiers": [f"hisense_tv_{tv_name}"],
+            "name": title,
+            "manufacturer": "Hisense",
+            "model": "Vidaa U",
+            "sw_version": "1.0.0"
+        }
+        # Entities are available only when both the bridge and the TV are:
+        # after a crash the TV topic stays retained online, the bridge last
+        # will turns the entities unavailable
+        availability = [
+            {"topic": self.bridge_availability_topic},
+            {"topic": f"{self.prefix}/{tv_name}/availability"},
+        ]
+        configs = {}
+        for component, object_id, suffix, fields in DISCOVERY_ENTITIES:
+            object_id = object_id.format(tv=tv_name)
+            unique_suffix = 'media_player' if component == 'media_player' else object_id[len(tv_name) + 1:]
+            config = {
+                "~": f"{self.prefix}/{tv_name}",
+                "name": f"{title} {suffix}" if suffix else title,
+                "unique_id": f"hisense_tv_{tv_name}_{unique_suffix}",
+                **fields,
+                "availability": availability,
+                "availability_mode": "all",
+                "device": device,
+            }
+            configs[f"{DISCOVERY_PREFIX}/{component}/{object_id}/config"] = json_dumps(config)
+        return configs
+
+    def on_retained(self, client, userdata, msg):
+        """paho callback for configs read back from the broker"""
+        with self._lock:
+            self._retained[msg.topic] = self.digest(msg.payload) if msg.payload else ''
+
+    def sync(self, client: mqtt.Client, tv_names: List[str], stop: Event):
+        """Publish changed configs; concurrent calls are folded into one more pass"""
+        self._tv_names = list(tv_names)
+        self._pending.set()
+        while self._pending.is_set() and not stop.is_set():
+            if not self._busy.acquire(blocking=False):
+                return  # The running pass picks the request up
+            try:
+                while self._pending.is_set() and not stop.is_set():
+                    self._pending.clear()
+                    self._sync_once(client, self._tv_names, stop)
+            except Exception as e:
+                logger.error(f"❌ Discovery error: {e}")
+            finally:
+                self._busy.release()
+
+    def _sync_once(self, client: mqtt.Client, tv_names: List[str], stop: Event):
+        desired: Dict[str, bytes] = {}
+        for name in tv_names:
+            desired.update(self.configs(name))
+        # Removed entities are cleared with an empty retained payload
+        stale = [topic for topic in self.published if topic not in desired]
+        topics = list(desired) + stale
+        if not topics:
+            return  # No TVs and nothing left to clear: paho rejects an empty subscribe
+        
+        # Read the retained configs back: what the broker has is what HA sees
+        with self._lock:
+            self._retained.clear()
+        client.message_callback_add(f"{DISCOVERY_PREFIX}/+/+/config", self.on_retained)
+        client.subscribe([(topic, 1) for topic in topics])
+        stop.wait(self.READBACK_WAIT)
+        client.unsubscribe(topics)
+        with self._lock:
+            retained = dict(self._retained)
+        
+        changes = [
+            (topic, payload) for topic, payload in desired.items()
+            if retained.get(topic) != self.digest(payload)
+        ] + [(topic, b'') for topic in stale if retained.get(topic, '') != '']
+        removed = sum(1 for _, payload in changes if not payload)
+        unchanged = len(desired) - (len(changes) - removed)
+        if unchanged:
+            MQTT_PUBLISHES_SKIPPED.inc(unchanged, kind='discovery')
+        
+        for topic, payload in changes:
+            if stop.is_set():
+                break
+            self.publish(topic, payload, 'discovery')
+            stop.wait(1 / self.RATE)
+        
+        self.published = {topic: self.digest(payload) for topic, payload in desired.items()}
+        self._save()
+        logger.info(f"📢 Discovery synced: {len(changes) - removed} published, "
+                    f"{removed} removed, {unchanged} unchanged")
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        try:
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.published, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save discovery cache: {e}")
+
+# ============================================================================
+# MQTT BRIDGE CLASS
+# ============================================================================
+
+class MQTTBridge:
+    """
+    Manages MQTT to Hisense TV bridge.
+    A single MQTT client is shared by every configured TV; commands on
+    <prefix>/<tv_name>/command/# are routed to the matching HisenseTV.
+    """
+
+    # Seconds after which an unanswered command is considered lost
+    COMMAND_TIMEOUT = 5
+    # Seconds after a command during which the TV is polled at the active rate
+    ACTIVE_WINDOW = 30
+    # Granularity of the session scheduler in state_monitor
+    MONITOR_TICK = 1
+    # Limits of command/sequence macros
+    SEQUENCE_MAX_STEPS = 50
+    SEQUENCE_MAX_WAIT = 60
+    # MQTT v5 message expiry of command acknowledgements, in seconds
+    REPLY_EXPIRY = 60
+    
+    # Config reload: settings applied by reconnecting MQTT, and settings
+    # only read at startup (a change is logged and waits for a restart)
+    MQTT_CONNECTION_KEYS = ('mqtt_broker', 'mqtt_port', 'mqtt_user', 'mqtt_password',
+                            'mqtt_protocol', 'mqtt_shared_group', 'mqtt_client_id')
+    RESTART_KEYS = ('mqtt_topic_prefix', 'data_dir', 'metrics_port', 'reconnect_concurrency',
+                    'power_probe_interval', 'network_discovery', 'network_scan_cidr')
+
+    def __init__(self, config: Dict[str, Any], tv_configs: List[Dict[str, Any]]):
+        self.config = config
+        self.tv_configs = {tv['name']: tv for tv in tv_configs}
+        self.snapshot = SnapshotStore(
+            self._data_path('snapshot.json'),
+            legacy_endpoints_path=self._data_path('endpoints.json')
+        )
+        self.mqtt_client: Optional[mqtt.Client] = None
+        self._instance_id = os.urandom(4).hex()
+        self.tvs: Dict[str, HisenseTV] = {}
+        self.command_queues: Dict[str, CommandQueue] = {
+            name: self._make_queue(tv) for name, tv in self.tv_configs.items()
+        }
+        self.running = False
+        self._stop_event = Event()
+        
+        # Last payload published per retained topic, used to skip duplicates
+        self._last_published: Dict[str, str] = {}
+        # TVState version last published per TV, unchanged TVs are skipped at once
+        self._published_version: Dict[str, int] = {}
+        self._publish_lock = Lock()
+        # Serialises state publishes, so an older snapshot never lands after a newer one
+        self._state_publish_lock = Lock()
+        self.publisher = PublishPipeline(
+            maxsize=config['mqtt_buffer_size'],
+            max_inflight=config['mqtt_max_inflight'],
+            expiry={'heartbeat': config['heartbeat_interval'], 'telemetry': self.REPLY_EXPIRY}
+        )
+        self._last_heartbeat: Dict[str, float] = {}
+        
+        # Session policy: poll faster after commands, close sockets of TVs in standby
+        self._last_command: Dict[str, float] = {}
+        self._next_poll: Dict[str, float] = {}
+        self._standby_since: Dict[str, float] = {}
+        self.suspended: Set[str] = set()
+        self._standby_checks: Set[str] = set()
+        # Last power probe result per offline TV, reconnects follow its edges
+        self._probe_reachable: Dict[str, bool] = {}
+        
+        # Sequences: state publishes are held until the end, waits watch state updates
+        self._deferred_publish: Set[str] = set()
+        self._state_changed = Condition()
+        
+        self.metrics_server: Optional[MetricsServer] = None
+        self.supervisor = ReconnectSupervisor(
+            self.setup_tv,
+            self._on_connect_result,
+            max_delay=config['reconnect_max_delay'],
+            concurrency=config['reconnect_concurrency']
+        )
+        self.power_prober = PowerProber(
+            self._probe_targets,
+            self._on_power_probe,
+            interval=config['power_probe_interval']
+        )
+        METRICS.register(Gauge(
+            'hisense_command_queue_depth', 'Commands waiting to be sent', ('tv',),
+            collect=lambda: {(name, ): q.depth() for name, q in list(self.command_queues.items())}))
+        METRICS.register(Gauge(
+            'hisense_tv_connected', 'Websocket connected to the TV', ('tv',),
+            collect=lambda: {(name, ): int(tv.connected) for name, tv in list(self.tvs.items())}))
+        METRICS.register(Gauge(
+            'hisense_mqtt_buffer_depth', 'Retained MQTT messages waiting for the broker',
+            collect=lambda: {(): self.publisher.depth()}))
+        METRICS.register(Gauge(
+            'hisense_tv_suspended', 'Websocket closed while the TV is in standby', ('tv',),
+            collect=lambda: {(name, ): int(name in self.suspended) for name in list(self.tv_configs)}))
+        METRICS.register(Gauge(
+            'hisense_tv_handshake_complete', 'Handshake answered by the TV', ('tv',),
+            collect=lambda: {(name, ): int(tv.ready.is_set()) for name, tv in list(self.tvs.items())}))
+        
+        # Calculate topic base
+        self.prefix = config['mqtt_topic_prefix']
+        self.bridge_availability_topic = f"{self.prefix}/bridge/availability"
+        self.inventory_topic = f"{self.prefix}/bridge/inventory"
+        # Admin topic, matched by the command subscription ('bridge' is not a valid TV name)
+        self.reload_topic = f"{self.prefix}/bridge/command/reload"
+        # Every valid command topic -> (queue, command), so routing is one lookup
+        self._routes: Dict[str, Tuple[CommandQueue, str]] = {}
+        for name, queue in self.command_queues.items():
+            self._add_routes(name, queue)
+        self.discovery = DiscoveryPublisher(
+            self.prefix,
+            self.bridge_availability_topic,
+            self._data_path('discovery.json'),
+            self.publisher.publish
+        )
+        
+        # Config hot-reload: SIGHUP, the admin topic or a change of the options file
+        self.options_path = self._data_path('options.json')
+        self._options_mtime = self._options_file_mtime()
+        self._reload_requested = Event()
+        # TVs from the configuration, as opposed to ones found on the network
+        self._configured: Set[str] = set(self.tv_configs)
+        
+        # LAN discovery: TVs found are matched to the configuration or added
+        self.scanner: Optional[NetworkScanner] = None
+        if config['network_discovery']:
+            self.scanner = NetworkScanner(
+                config['network_scan_cidr'],
+                self._data_path('inventory.json'),
+                self._on_network_scan,
+                interval=config['network_scan_interval']
+            )
+            # TVs found by earlier runs are driven right away
+            for record in self.scanner.records():
+                self._on_tv_found(record)
+
+    def _make_queue(self, tv_config: Dict[str, Any]) -> CommandQueue:
+        return CommandQueue(
+            tv_config['name'],
+            self._make_executor(tv_config['name']),
+            rate=tv_config['command_rate'],
+            maxsize=self.config['command_queue_size']
+        )
+
+    def _add_routes(self, tv_name: str, queue: CommandQueue):
+        for command in list(COMMAND_REGISTRY) + ['sequence']:
+            self._routes[f"{self._command_topic(tv_name)}/{command}"] = (queue, command)
+
+    @property
+    def command_subscription(self) -> str:
+        """Command filter, shared between the bridges of a group if configured"""
+        topic_filter = f"{self.prefix}/+/command/#"
+        group = self.config['mqtt_shared_group']
+        return f"$share/{group}/{topic_filter}" if group else topic_filter
+
+    def _data_path(self, filename: str) -> Optional[str]:
+        """Path of a persistent file under the data dir, None if unavailable"""
+        data_dir = self.config['data_dir']
+        if data_dir and os.path.isdir(data_dir):
+            return os.path.join(data_dir, filename)
+        return None
+
+    def _base_topic(self, tv_name: str) -> str:
+        return f"{self.prefix}/{tv_name}"
+
+    def _command_topic(self, tv_name: str) -> str:
+        return f"{self.prefix}/{tv_name}/command"
+
+    def _state_topic(self, tv_name: str) -> str:
+        return f"{self.prefix}/{tv_name}/state"
+
+    def _availability_topic(self, tv_name: str) -> str:
+        return f"{self.prefix}/{tv_name}/availability"
+
+    def setup_mqtt(self, background: bool = False) -> bool:
+        """
+        Initialize MQTT client. With `background`, the first connection is
+        made by paho's network thread, which keeps retrying an unreachable
+        broker instead of failing
+        """
+        try:
+            client_id = self.config['mqtt_client_id']
+            if not client_id:
+                if len(self.tv_configs) == 1:
+                    client_id = f"hisense_tv_{next(iter(self.tv_configs))}"
+                else:
+                    client_id = "hisense_tv_bridge"
+                if self.config['mqtt_shared_group']:
+                    # Members of a group must not take over each other's session
+                    client_id = f"{client_id}_{self._instance_id}"
+            mqtt5 = self.config['mqtt_protocol'] == '5'
+            self.mqtt_client = mqtt.Client(
+                client_id=client_id,
+                protocol=mqtt.MQTTv5 if mqtt5 else mqtt.MQTTv311
+            )
+            
+            if self.config['mqtt_user'] and self.config['mqtt_password']:
+                self.mqtt_client.username_pw_set(
+                    self.config['mqtt_user'],
+                    self.config['mqtt_password']
+                )
+            
             self.mqtt_client.on_connect = self._on_mqtt_connect
             self.mqtt_client.on_message = self._on_mqtt_message
             self.mqtt_client.on_disconnect = self._on_mqtt_disconnect
+            self.publisher.attach(self.mqtt_client, mqtt5)
             
             self.mqtt_client.will_set(
-                self.availability_topic,
+                self.bridge_availability_topic,
                 payload="offline",
                 qos=1,
                 retain=True
             )
             
-            logger.info(f"🌐 Connecting to MQTT broker: {self.config['mqtt_broker']}:{self.config['mqtt_port']}")
-            self.mqtt_client.connect(
+            logger.info(f"🌐 Connecting to MQTT broker: {self.config['mqtt_broker']}:{self.config['mqtt_port']}"
+                        f"{' (MQTT v5)' if mqtt5 else ''}")
+            connect = self.mqtt_client.connect_async if background else self.mqtt_client.connect
+            connect(
                 self.config['mqtt_broker'],
                 self.config['mqtt_port'],
                 60
@@ -501,22 +2841,37 @@ class MQTTBridge:
             logger.error(f"❌ MQTT configuration error: {e}")
             return False
 
-    def _on_mqtt_connect(self, client, userdata, flags, rc):
-        """MQTT connection callback"""
+    def _on_mqtt_connect(self, client, userdata, flags, rc, properties=None):
+        """MQTT connection callback (`properties` under MQTT v5)"""
         if rc == 0:
             logger.info("✅ Connected to MQTT broker")
             
-            client.publish(self.availability_topic, "online", qos=1, retain=True)
-            client.subscribe(f"{self.command_topic}/#", qos=1)
-            logger.info(f"📡 Subscribed to: {self.command_topic}/#")
+            self.publisher.publish(self.bridge_availability_topic, "online", 'availability')
+            # The broker may have lost retained values: republish everything once.
+            # Queued behind messages buffered during the outage, coalesced per
+            # topic, then flushed as one minimal set
+            with self._publish_lock:
+                self._last_published.clear()
+            with self._state_publish_lock:
+                self._published_version.clear()
+            for name, tv in list(self.tvs.items()):
+                self._publish_availability(name, tv.connected or name in self.suspended)
+                # Last known values, restored from the snapshot on a warm start
+                if tv.state_received or tv.restored:
+                    self._publish_state(tv)
+            self.publisher.on_connect(getattr(properties, 'TopicAliasMaximum', 0))
+            client.subscribe(self.command_subscription, qos=1)
+            logger.info(f"📡 Subscribed to: {self.command_subscription}")
             
             if self.config['auto_discovery']:
-                self._publish_discovery()
+                # Off the network thread: the sync waits for retained configs
+                Thread(target=self._publish_discovery, name='discovery', daemon=True).start()
         else:
             logger.error(f"❌ MQTT connection failed, code: {rc}")
 
-    def _on_mqtt_disconnect(self, client, userdata, rc):
+    def _on_mqtt_disconnect(self, client, userdata, rc, properties=None):
         """MQTT disconnection callback"""
+        self.publisher.on_disconnect()
         if rc != 0:
             logger.warning(f"⚠️ Unexpected MQTT disconnection, code: {rc}")
 
@@ -526,284 +2881,832 @@ class MQTTBridge:
             topic = msg.topic
             payload = msg.payload.decode('utf-8')
             
-            logger.debug(f"📨 MQTT message - Topic: {topic}, Payload: {payload}")
+            if should_trace(logger, 'mqtt_in'):
+                logger.debug("📨 MQTT message - Topic: %s, Payload: %s", topic, payload)
             
-            command = topic.replace(f"{self.command_topic}/", "")
-            self._process_command(command, payload)
+            route = self._routes.get(topic)
+            if route is None and topic == self.reload_topic:
+                self.request_reload()
+                return
+            if route is None:
+                tv_name = topic[len(self.prefix) + 1:].split('/', 1)[0]
+                if tv_name in self.tv_configs:
+                    logger.warning(f"⚠️ Unknown command topic: {topic}")
+                else:
+                    # Another bridge sharing the prefix drives this TV
+                    logger.debug("Ignoring command for unknown TV: %s", topic)
+                return
+            queue, command = route
+            # MQTT v5 request/response: the requester wants an acknowledgement
+            reply = None
+            properties = getattr(msg, 'properties', None)
+            if hasattr(properties, 'ResponseTopic'):
+                reply = CommandReply(properties.ResponseTopic, getattr(properties, 'CorrelationData', b''))
+            # Never execute on the paho network thread
+            if not queue.put(command, payload, reply) and reply:
+                self._acknowledge([reply], queue.name, command, payload, 'dropped')
             
         except Exception as e:
             logger.error(f"❌ MQTT message processing error: {e}")
 
-    def _process_command(self, command: str, payload: str):
+    def _make_executor(self, tv_name: str) -> Callable[[QueuedCommand], None]:
+        """Sender-thread callback executing queued commands on the current TV"""
+        def execute(queued: QueuedCommand):
+            tv = self.tvs.get(tv_name)
+            if tv is None:
+                logger.warning(f"⚠️ TV {tv_name} not initialized, command ignored")
+                self._acknowledge(queued.replies, tv_name, queued.command, queued.payload, 'error')
+                return
+            self._mark_active(tv_name)
+            if tv_name in self.suspended:
+                self._resume_tv(tv_name)
+            if queued.command == 'volume' and queued.payload.lower() in ('up', 'down'):
+                if queued.volume_delta:
+                    self._process_volume_delta(tv, queued.volume_delta, queued.replies)
+                else:
+                    # Steps that cancelled out while queued: nothing to send
+                    self._acknowledge(queued.replies, tv_name, queued.command, queued.payload,
+                                      'ok', reason='no-op')
+            elif queued.command == 'sequence':
+                self._run_sequence(tv, queued.payload, queued.replies)
+            else:
+                self._process_command(tv, queued.command, queued.payload, queued.replies)
+        return execute
+
+    def _acknowledge(self, replies: List[CommandReply], tv_name: str, command: str, payload: str,
+                     status: str, rtt: Optional[float] = None, reason: Optional[str] = None):
+        """
+        MQTT v5 request/response: publish the outcome of a command to each
+        requester's response topic with its correlation data. Status is ok,
+        timeout, error, dropped, or sent (Wake-on-LAN, never answered)
+        """
+        if not replies:
+            return
+        ack = {
+            'tv': tv_name,
+            'command': command,
+            'payload': payload,
+            'status': status,
+            'rtt_ms': round(rtt * 1000, 1) if rtt is not None else None,
+        }
+        if reason:
+            ack['reason'] = reason
+        ack = json_dumps(ack)
+        for reply in replies:
+            properties = Properties(PacketTypes.PUBLISH)
+            if reply.correlation:
+                properties.CorrelationData = reply.correlation
+            self.publisher.publish(reply.topic, ack, 'telemetry', properties)
+
+    def _process_volume_delta(self, tv: HisenseTV, delta: int, replies: Optional[List[CommandReply]] = None):
+        """Apply coalesced volume steps: one key press, or one setvolume"""
+        if abs(delta) == 1 or not tv.state_received:
+            for step in range(abs(delta)):
+                # Requesters are answered with the last step
+                last = step == abs(delta) - 1
+                self._process_command(tv, 'volume', 'up' if delta > 0 else 'down',
+                                      replies if last else None)
+        else:
+            target = min(100, max(0, int(tv.state.volume) + delta))
+            self._process_command(tv, 'volume', str(target), replies)
+
+    def _process_command(self, tv: HisenseTV, command: str, payload: str,
+                         replies: Optional[List[CommandReply]] = None):
         """Process MQTT command"""
-        if not self.tv or not self.tv.connected:
-            logger.warning("⚠️ TV not connected, command ignored")
+        if command == "power" and payload.lower() == "on" and not tv.connected:
+            self._wake_tv(tv)
+            self._acknowledge(replies, tv.name, command, payload, 'sent')
             return
         
-        try:
-            payload_lower = payload.lower()
-            
-            # Power commands
-            if command == "power":
-                if payload_lower == "on":
-                    self.tv.power_on()
-                elif payload_lower == "off":
-                    self.tv.power_off()
-                elif payload_lower == "toggle":
-                    if self.tv.state['power'] == 'ON':
-                        self.tv.power_off()
-                    else:
-                        self.tv.power_on()
-                        
-            # Volume commands
-            elif command == "volume":
-                if payload_lower == "up":
-                    self.tv.volume_up()
-                elif payload_lower == "down":
-                    self.tv.volume_down()
-                elif payload.isdigit():
-                    self.tv.set_volume(int(payload))
-                    
-            # Mute
-            elif command == "mute":
-                self.tv.mute()
-                
-            # Source
-            elif command == "source":
-                self.tv.set_source(payload)
-                
-            # Channel
-            elif command == "channel":
-                if payload_lower == "up":
-                    self.tv.channel_up()
-                elif payload_lower == "down":
-                    self.tv.channel_down()
-                elif payload.isdigit():
-                    self.tv.set_channel(int(payload))
-                    
-            # Navigation
-            elif command == "navigate":
-                self.tv.navigate(payload)
-                
-            # Raw key
-            elif command == "key":
-                self.tv.send_key(payload)
-                
-            else:
-                logger.warning(f"⚠️ Unknown command: {command}")
-            
-            # Publish state after command
-            time.sleep(0.1)
-            self._publish_state()
-            
-        except Exception as e:
-            logger.error(f"❌ Command processing error: {e}")
-
-    def _publish_state(self):
-        """Publish TV state to MQTT"""
-        if not self.tv or not self.mqtt_client:
+        if not tv.connected:
+            logger.warning(f"⚠️ TV {tv.name} not connected, command ignored")
+            self._acknowledge(replies, tv.name, command, payload, 'error')
+            return
+        
+        spec = COMMAND_REGISTRY.get(command)
+        if spec is None:
+            logger.warning(f"⚠️ Unknown command: {command}")
+            self._acknowledge(replies, tv.name, command, payload, 'error')
+            return
+        action = spec.resolve(payload)
+        if action is None:
+            logger.warning(f"⚠️ Invalid payload for {command}: {payload}")
+            self._acknowledge(replies, tv.name, command, payload, 'error')
             return
         
         try:
-            state_data = {
-                'power': self.tv.state['power'],
-                'volume': self.tv.state['volume'],
-                'muted': self.tv.state['muted'],
-                'source': self.tv.state['source'],
-                'channel': self.tv.state['channel'],
-                'timestamp': datetime.now().isoformat()
-            }
+            response = tv.expect_response()
+            sent_at = time.monotonic()
+            started = time.perf_counter()
             
-            # Publish global state
-            self.mqtt_client.publish(
-                self.state_topic,
-                json.dumps(state_data),
-                qos=1,
-                retain=True
-            )
+            result = action(tv)
             
-            # Publish individual states
-            for key, value in state_data.items():
-                if key != 'timestamp':
-                    self.mqtt_client.publish(
-                        f"{self.state_topic}/{key}",
-                        str(value),
-                        qos=1,
-                        retain=True
-                    )
+            COMMAND_SECONDS.observe(time.perf_counter() - started, tv=tv.name, command=command)
+            if not result:
+                # Nothing reached the TV, so no answer will come
+                tv.cancel_response(response)
+                if result is None:
+                    self._acknowledge(replies, tv.name, command, payload, 'ok', reason='no-op')
+                else:
+                    self._acknowledge(replies, tv.name, command, payload, 'error')
+                return
             
-            logger.debug(f"State published: {state_data}")
+            # State is published when the TV answers, never by waiting here
+            response.add_done_callback(
+                lambda future: self._on_command_response(tv, command, sent_at, future, payload, replies)
+            )
             
         except Exception as e:
-            logger.error(f"❌ State publishing error: {e}")
+            logger.error(f"❌ Command processing error: {e}")
+            self._acknowledge(replies, tv.name, command, payload, 'error')
 
-    def _publish_discovery(self):
-        """Publish Home Assistant discovery configuration"""
-        logger.info("📢 Publishing Home Assistant auto-discovery")
+    def _parse_sequence(self, payload: str) -> Optional[List[Dict[str, Any]]]:
+        """Validate a sequence payload up front, None if any step is invalid"""
+        try:
+            steps = json_loads(payload)
+        except ValueError:
+            logger.warning("⚠️ Sequence payload is not JSON")
+            return None
+        if isinstance(steps, dict):
+            steps = steps.get('steps')
+        if not isinstance(steps, list) or not steps or len(steps) > self.SEQUENCE_MAX_STEPS:
+            logger.warning(f"⚠️ Sequence must be a list of 1 to {self.SEQUENCE_MAX_STEPS} steps")
+            return None
+        for index, step in enumerate(steps):
+            valid = (
+                isinstance(step, dict)
+                and any(key in step for key in ('command', 'wait', 'wait_for'))
+                and ('command' not in step or self._valid_command(step['command'], step.get('payload', '')))
+                and isinstance(step.get('wait', 0), (int, float))
+                and 0 <= step.get('wait', 0) <= self.SEQUENCE_MAX_WAIT
+                and isinstance(step.get('wait_for', {}), dict)
+                and isinstance(step.get('timeout', 0), (int, float))
+            )
+            if not valid:
+                logger.warning(f"⚠️ Invalid sequence step {index}: {step}")
+                return None
+        return steps
+
+    @staticmethod
+    def _valid_command(command: Any, payload: Any) -> bool:
+        spec = COMMAND_REGISTRY.get(command) if isinstance(command, str) else None
+        return spec is not None and spec.resolve(str(payload)) is not None
+
+    def _wait_for_state(self, tv: HisenseTV, expected: Dict[str, Any], timeout: float) -> bool:
+        """Block until every expected state field matches, or the timeout"""
+        def matches():
+            return all(
+                str(getattr(tv.state, key, None)).lower() == str(value).lower()
+                for key, value in expected.items()
+            )
         
-        device_info = {
-            "identifiers": [f"hisense_tv_{self.config['tv_name']}"],
-            "name": f"Hisense TV {self.config['tv_name'].capitalize()}",
-            "manufacturer": "Hisense",
-            "model": "Vidaa U",
-            "sw_version": "1.0.0"
-        }
+        deadline = time.monotonic() + min(timeout, self.SEQUENCE_MAX_WAIT)
+        while not matches():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop_event.is_set():
+                return False
+            # Without pushes from the TV, ask for the state at the active rate
+            if tv.connected and not tv.subscribed:
+                tv._request_state()
+            with self._state_changed:
+                self._state_changed.wait(min(remaining, self.config['active_scan_interval']))
+        return True
+
+    def _run_sequence(self, tv: HisenseTV, payload: str, replies: Optional[List[CommandReply]] = None):
+        """
+        Run a command/sequence macro on the sender thread, e.g.
+        [{"command": "source", "payload": "HDMI2"}, {"wait_for": {"source": "HDMI2"}},
+         {"command": "volume", "payload": 20, "wait": 0.5}, {"command": "key", "payload": "KEY_NETFLIX"}]
+        Each step runs its command, then its wait, then its wait_for condition.
+        State is published once, when the sequence ends, and requesters are
+        acknowledged after it with the duration of the whole sequence.
+        """
+        steps = self._parse_sequence(payload)
+        if steps is None:
+            self._acknowledge(replies, tv.name, 'sequence', payload, 'error')
+            return
         
-        # Media Player
-        media_player_config = {
-            "name": f"Hisense TV {self.config['tv_name'].capitalize()}",
-            "unique_id": f"hisense_tv_{self.config['tv_name']}_media_player",
-            "command_topic": f"{self.command_topic}/power",
-            "state_topic": f"{self.state_topic}/power",
-            "payload_on": "on",
-            "payload_off": "off",
-            "state_on": "ON",
-            "state_off": "OFF",
-            "availability_topic": self.availability_topic,
-            "device": device_info,
-            "icon": "mdi:television"
-        }
+        min_interval = self.command_queues[tv.name].min_interval
+        started = time.monotonic()
+        status = None
+        self._deferred_publish.add(tv.name)
+        try:
+            for index, step in enumerate(steps):
+                if self._stop_event.is_set():
+                    return
+                command = step.get('command')
+                if command:
+                    self._process_command(tv, command, str(step.get('payload', '')))
+                    # Same pacing toward the TV as queued commands
+                    self._stop_event.wait(min_interval)
+                if step.get('wait'):
+                    self._stop_event.wait(step['wait'])
+                if step.get('wait_for') and \
+                        not self._wait_for_state(tv, step['wait_for'], step.get('timeout', 10)):
+                    logger.warning(f"⏱️ Sequence on {tv.name} stopped at step {index}: "
+                                   f"state never matched {step['wait_for']}")
+                    status = 'timeout'
+                    return
+            status = 'ok'
+            logger.info(f"🎬 Sequence of {len(steps)} step(s) on {tv.name} "
+                        f"done in {time.monotonic() - started:.2f}s")
+        finally:
+            # Let the TV answer the last steps, then publish the settled state once
+            if tv.connected:
+                settled = tv.expect_response()
+                tv._request_state()
+                try:
+                    settled.result(self.COMMAND_TIMEOUT)
+                except Exception:
+                    pass
+            self._deferred_publish.discard(tv.name)
+            self._publish_state(tv)
+            if status:
+                self._acknowledge(replies, tv.name, 'sequence', payload, status, time.monotonic() - started)
+
+    def _on_command_response(self, tv: HisenseTV, command: str, sent_at: float, future: Future,
+                             payload: str = '', replies: Optional[List[CommandReply]] = None):
+        """Completion of a command: the TV acked it or echoed its state"""
+        if future.exception() is not None:
+            logger.debug("No response from %s to '%s', requesting state", tv.name, command)
+            self._acknowledge(replies, tv.name, command, payload, 'timeout')
+            if tv.connected:
+                tv._request_state()
+            return
         
-        self.mqtt_client.publish(
-            f"homeassistant/media_player/{self.config['tv_name']}/config",
-            json.dumps(media_player_config),
-            qos=1,
-            retain=True
-        )
+        data = future.result()
+        rtt = time.monotonic() - sent_at
+        COMMAND_RTT_SECONDS.observe(rtt, tv=tv.name)
+        self._acknowledge(replies, tv.name, command, payload, 'ok', rtt)
+        if should_trace(logger, 'command_rtt'):
+            logger.debug("'%s' on %s answered in %.1f ms", command, tv.name, rtt * 1000)
+        if data.get('action', '').lower() != 'state' and 'power' not in data:
+            # Plain ack without state: ask for the state echo explicitly
+            tv._request_state()
+
+    def _publish_if_changed(self, topic: str, payload: str, kind: str = 'state') -> bool:
+        """Publish a retained QoS 1 payload unless it is already the last one sent"""
+        with self._publish_lock:
+            if self._last_published.get(topic) == payload:
+                MQTT_PUBLISHES_SKIPPED.inc(kind=kind)
+                return False
+            self._last_published[topic] = payload
+        self.publisher.publish(topic, payload, kind)
+        return True
+
+    def _publish_state(self, tv: HisenseTV):
+        """Publish changed TV state fields to MQTT"""
+        if not self.mqtt_client:
+            return
         
-        # Power switch
-        switch_config = {
-            "name": f"Hisense TV {self.config['tv_name'].capitalize()} Power",
-            "unique_id": f"hisense_tv_{self.config['tv_name']}_power",
-            "command_topic": f"{self.command_topic}/power",
-            "state_topic": f"{self.state_topic}/power",
-            "payload_on": "on",
-            "payload_off": "off",
-            "state_on": "ON",
-            "state_off": "OFF",
-            "availability_topic": self.availability_topic,
-            "device": device_info,
-            "icon": "mdi:power"
+        with self._state_publish_lock:
+            snapshot = tv.state.snapshot()
+            if snapshot.version <= self._published_version.get(tv.name, -1):
+                return  # Nothing changed since the last publish
+            self._published_version[tv.name] = snapshot.version
+            
+            state_topic = self._state_topic(tv.name)
+            try:
+                state_data = snapshot.fields()
+                
+                # Publish individual states, only the ones that changed
+                changed = [
+                    key for key, value in state_data.items()
+                    if self._publish_if_changed(f"{state_topic}/{key}", str(value))
+                ]
+                if not changed:
+                    return
+                
+                # Global state is only rewritten on a real change; its timestamp
+                # is the time of that change
+                state_data['timestamp'] = datetime.now().isoformat()
+                self.publisher.publish(state_topic, json_dumps(state_data), 'state')
+                
+                if should_trace(logger, 'state_publish'):
+                    logger.debug("State published for %s, changed: %s", tv.name, changed)
+                
+            except Exception as e:
+                logger.error(f"❌ State publishing error: {e}")
+
+    def _publish_availability(self, tv_name: str, online: bool):
+        """Publish per-TV availability"""
+        if self.mqtt_client:
+            self._publish_if_changed(
+                self._availability_topic(tv_name),
+                "online" if online else "offline",
+                kind='availability'
+            )
+
+    def _publish_heartbeat(self, tv: HisenseTV):
+        """Low-rate, non-retained freshness signal, separate from state"""
+        interval = self.config['heartbeat_interval']
+        if not interval or not self.mqtt_client:
+            return
+        now = time.monotonic()
+        if now - self._last_heartbeat.get(tv.name, 0) < interval:
+            return
+        self._last_heartbeat[tv.name] = now
+        last_seen = datetime.fromtimestamp(tv.last_seen).isoformat() if tv.last_seen else None
+        heartbeat = {
+            'connected': tv.connected,
+            'suspended': tv.name in self.suspended,
+            'last_seen': last_seen,
         }
-        
-        self.mqtt_client.publish(
-            f"homeassistant/switch/{self.config['tv_name']}_power/config",
-            json.dumps(switch_config),
-            qos=1,
-            retain=True
+        queue = self.command_queues.get(tv.name)
+        if queue:
+            heartbeat['commands'] = queue.stats()
+        self.publisher.publish(
+            f"{self._base_topic(tv.name)}/heartbeat",
+            json_dumps(heartbeat),
+            'heartbeat'
         )
+
+    def _publish_discovery(self):
+        """Publish the Home Assistant discovery configs that changed"""
+        self.discovery.sync(self.mqtt_client, list(self.tv_configs), self._stop_event)
+
+    def add_tv(self, tv_config: Dict[str, Any]):
+        """Start driving a TV found on the network while the bridge runs"""
+        name = tv_config['name']
+        queue = self._make_queue(tv_config)
+        self.command_queues[name] = queue
+        self.tv_configs[name] = tv_config
+        self._add_routes(name, queue)
+        logger.info(f"🆕 TV {name} added: {tv_config['ip']}:{tv_config['port']}")
+        if not self.running:
+            return  # run() starts everything configured
+        self._get_tv(name)
+        queue.start()
+        self.supervisor.schedule(name, delay=0)
+        self._resync_discovery()
+
+    def remove_tv(self, tv_name: str):
+        """Stop driving a TV removed from the configuration"""
+        self.supervisor.cancel(tv_name)
+        self.tv_configs.pop(tv_name, None)
+        for command in list(COMMAND_REGISTRY) + ['sequence']:
+            self._routes.pop(f"{self._command_topic(tv_name)}/{command}", None)
+        queue = self.command_queues.pop(tv_name, None)
+        if queue:
+            queue.stop()
+        self.suspended.discard(tv_name)
+        self._standby_checks.discard(tv_name)
+        self._probe_reachable.pop(tv_name, None)
+        tv = self.tvs.pop(tv_name, None)
+        if tv:
+            tv.on_disconnect = None
+            tv.disconnect()
+        self._publish_availability(tv_name, False)
+        logger.info(f"🗑️ TV {tv_name} removed")
+        self._resync_discovery()
+
+    def _resync_discovery(self):
+        """Re-sync Home Assistant discovery after the set of TVs changed"""
+        if self.config['auto_discovery'] and self.mqtt_client and self.mqtt_client.is_connected():
+            Thread(target=self._publish_discovery, name='discovery', daemon=True).start()
+
+    def _on_tv_found(self, record: Dict[str, Any]):
+        """A TV answered a network scan: match it by MAC, then IP, else add it"""
+        if not record.get('confirmed'):
+            # Only a Vidaa port open: could be any device, never driven
+            logger.debug(f"Network scan candidate {record['ip']}:{record['port']} not confirmed as a TV")
+            return
+        mac = normalize_mac(record.get('mac', ''))
+        match = None
+        for name, tv_config in list(self.tv_configs.items()):
+            configured_mac = normalize_mac(tv_config.get('mac', ''))
+            if mac and configured_mac == mac:
+                match = name
+                break
+            if tv_config['ip'] == record['ip'] and not (mac and configured_mac):
+                match = name
         
-        # Volume sensor
-        volume_sensor = {
-            "name": f"Hisense TV {self.config['tv_name'].capitalize()} Volume",
-            "unique_id": f"hisense_tv_{self.config['tv_name']}_volume",
-            "state_topic": f"{self.state_topic}/volume",
-            "availability_topic": self.availability_topic,
-            "unit_of_measurement": "%",
-            "device": device_info,
-            "icon": "mdi:volume-high"
-        }
-        
-        self.mqtt_client.publish(
-            f"homeassistant/sensor/{self.config['tv_name']}_volume/config",
-            json.dumps(volume_sensor),
-            qos=1,
-            retain=True
-        )
+        if match is None:
+            if mac:
+                name = f"tv_{mac.replace(':', '')}"
+            else:
+                name = f"tv_{record['ip'].replace('.', '_')}"
+            self.add_tv({
+                'name': name,
+                'ip': record['ip'],
+                'port': record['port'],
+                'ssl': record['ssl'],
+                'command_rate': self.config['command_rate'],
+                'mac': mac,
+            })
+            return
         
-        logger.info("✅ Discovery configuration published")
+        tv_config = self.tv_configs[match]
+        tv = self.tvs.get(match)
+        if mac and not tv_config.get('mac'):
+            # Learnt MAC: enables Wake-on-LAN for this TV
+            tv_config['mac'] = mac
+            if tv:
+                tv.mac = mac
+        if tv_config['ip'] != record['ip'] and not (tv and tv.connected):
+            logger.info(f"📍 TV {match} moved: {tv_config['ip']} -> {record['ip']}")
+            tv_config['ip'] = record['ip']
+            if tv:
+                tv.ip = record['ip']
+            if self.running:
+                self.supervisor.schedule(match, delay=0, reset=True)
 
-    def setup_tv(self) -> bool:
-        """Initialize TV connection"""
-        try:
-            logger.info(f"📺 Initializing TV: {self.config['tv_ip']}:{self.config['tv_port']}")
-            self.tv = HisenseTV(
-                self.config['tv_ip'],
-                self.config['tv_port'],
-                self.config['tv_ssl']
+    def _on_network_scan(self, records: List[Dict[str, Any]]):
+        """Scanner callback after each pass"""
+        for record in records:
+            self._on_tv_found(record)
+        if self.mqtt_client:
+            self.publisher.publish(self.inventory_topic, json_dumps(self.scanner.records()), 'state')
+
+    def _get_tv(self, tv_name: str) -> HisenseTV:
+        """The HisenseTV for a name, created once and reused across reconnects"""
+        tv = self.tvs.get(tv_name)
+        if tv is None:
+            tv_config = self.tv_configs[tv_name]
+            tv = HisenseTV(
+                tv_config['ip'],
+                tv_config['port'],
+                tv_config['ssl'],
+                name=tv_name,
+                snapshot=self.snapshot,
+                mac=tv_config.get('mac', '')
             )
+            tv.restore()
+            tv.subscribe = bool(self.config['push_silence_timeout'])
+            tv.ping_interval = self.config['ws_ping_interval']
+            tv.ping_timeout = self.config['ws_ping_timeout']
+            tv.on_state_update = self._on_tv_state
+            tv.on_disconnect = self._on_tv_disconnect
+            self.tvs[tv_name] = tv
+        return tv
+
+    def setup_tv(self, tv_name: str) -> bool:
+        """(Re)connect a TV, tearing down any previous socket and thread first"""
+        tv_config = self.tv_configs.get(tv_name)
+        if tv_config is None:
+            return False  # Removed by a config reload
+        try:
+            logger.info(f"📺 Connecting TV {tv_name}: {tv_config['ip']}:{tv_config['port']}")
+            tv = self._get_tv(tv_name)
+            if tv.ws or tv.ws_thread:
+                tv.disconnect()
             
-            tv_thread = Thread(target=self.tv.connect, daemon=True)
-            tv_thread.start()
-            
-            timeout = 10
-            start_time = time.time()
-            while not self.tv.connected and (time.time() - start_time) < timeout:
-                time.sleep(0.5)
-            
-            if self.tv.connected:
-                logger.info("✅ TV connected successfully")
+            if tv.connect():
+                logger.info(f"✅ TV {tv_name} connected successfully")
                 return True
             else:
-                logger.warning("⏱️ TV connection timeout")
+                logger.warning(f"⏱️ TV {tv_name} connection failed")
                 return False
                 
         except Exception as e:
-            logger.error(f"❌ TV setup error: {e}")
+            logger.error(f"❌ TV setup error ({tv_name}): {e}")
             return False
 
+    def setup_tvs(self):
+        """Schedule the first connection of every configured TV"""
+        for name in self.tv_configs:
+            self._get_tv(name)
+            self.supervisor.schedule(name, delay=0)
+
+    def _on_connect_result(self, tv_name: str, success: bool):
+        """Supervisor callback after each connection attempt"""
+        if tv_name not in self.tv_configs:
+            return
+        self._publish_availability(tv_name, success)
+        if not success:
+            self._standby_checks.discard(tv_name)
+            attempts = self.supervisor.attempts.get(tv_name, 0)
+            logger.info(f"🔁 TV {tv_name} unreachable ({attempts} failed attempt(s)), backing off")
+
+    def _probe_targets(self) -> List[Tuple[str, str, int]]:
+        """Offline TVs to sweep, on their last known port (suspended ones are polled instead)"""
+        return [
+            (name, tv.ip, tv.port)
+            for name, tv in list(self.tvs.items())
+            if not tv.connected and name not in self.suspended
+        ]
+
+    def _on_power_probe(self, tv_name: str, reachable: bool):
+        """
+        Power prober callback for an offline TV. Only a TV that starts
+        answering again skips the backoff: one that accepts TCP but keeps
+        refusing the websocket is left to the supervisor's schedule
+        """
+        tv = self.tvs.get(tv_name)
+        if tv is None or tv.connected:
+            return
+        was_reachable = self._probe_reachable.get(tv_name)
+        self._probe_reachable[tv_name] = reachable
+        if reachable:
+            if was_reachable or self.supervisor.connecting(tv_name):
+                return
+            logger.info(f"👀 TV {tv_name} is answering again, connecting")
+            self.supervisor.schedule(tv_name, delay=0, reset=True)
+        elif tv.set_state(power='OFF'):
+            # Unreachable TV is in standby (or unplugged)
+            self._publish_state(tv)
+
+    def _wake_tv(self, tv: HisenseTV):
+        """power/on for a TV whose websocket is down"""
+        if tv.wake(self.config['wol_broadcast']):
+            # The prober notices the TV booting; retry promptly meanwhile
+            self.supervisor.schedule(tv.name, delay=2, reset=True)
+
+    def _on_tv_disconnect(self, tv: HisenseTV):
+        """Websocket callback: an established connection dropped"""
+        logger.warning(f"⚠️ TV {tv.name} disconnected, scheduling reconnection")
+        self._publish_availability(tv.name, False)
+        if self.running:
+            self.supervisor.schedule(tv.name)
+
+    def _on_tv_state(self, tv: HisenseTV):
+        """State received from a TV"""
+        with self._state_changed:
+            self._state_changed.notify_all()
+        if tv.name not in self._deferred_publish:
+            self._publish_state(tv)
+        if tv.name in self._standby_checks:
+            self._standby_checks.discard(tv.name)
+            if tv.state.power == 'OFF':
+                # Still in standby after a standby check: suspend on the next tick
+                self._standby_since[tv.name] = float('-inf')
+
+    def _mark_active(self, tv_name: str):
+        """A command arrived: poll at the active rate for a while"""
+        now = time.monotonic()
+        self._last_command[tv_name] = now
+        self._next_poll[tv_name] = now + self.config['active_scan_interval']
+
+    def _poll_interval(self, tv: HisenseTV, now: float) -> float:
+        """Seconds until the next state request for a connected TV"""
+        if now - self._last_command.get(tv.name, float('-inf')) < self.ACTIVE_WINDOW:
+            return self.config['active_scan_interval']
+        return self.config['scan_interval']
+
+    def _suspend_tv(self, tv: HisenseTV):
+        """Close the socket of a TV in standby, it keeps its last state and availability"""
+        logger.info(f"💤 TV {tv.name} in standby, suspending its session")
+        self.suspended.add(tv.name)
+        self.supervisor.cancel(tv.name)
+        self._standby_since.pop(tv.name, None)
+        self._next_poll[tv.name] = time.monotonic() + self.config['standby_scan_interval']
+        tv.disconnect()
+
+    def _resume_tv(self, tv_name: str) -> bool:
+        """Reopen a suspended session right away (sender thread, before a command)"""
+        self.suspended.discard(tv_name)
+        self._standby_checks.discard(tv_name)
+        self.supervisor.cancel(tv_name)
+        logger.info(f"⏰ Resuming session of TV {tv_name}")
+        success = self.setup_tv(tv_name)
+        self._on_connect_result(tv_name, success)
+        if not success:
+            self.supervisor.schedule(tv_name)
+        return success
+
+    def _check_session(self, tv: HisenseTV, now: float):
+        """Apply the session policy to one TV"""
+        if tv.name in self.suspended:
+            if now >= self._next_poll.get(tv.name, 0):
+                # Standby check: reconnect, read the state, suspend again if still off
+                self.suspended.discard(tv.name)
+                self._standby_checks.add(tv.name)
+                self.supervisor.schedule(tv.name, delay=0, reset=True)
+            return
+        if not tv.connected:
+            return  # Reconnection is handled by the supervisor
+        if not tv.keepalive(self.config['liveness_timeout']):
+            return  # Dead connection: on_disconnect reports it offline and reconnects
+        
+        tv.expire_pending(self.COMMAND_TIMEOUT)
+        suspend_delay = self.config['standby_suspend_delay']
+        if suspend_delay and tv.state_received and tv.state.power == 'OFF':
+            idle_since = max(
+                self._standby_since.setdefault(tv.name, now),
+                self._last_command.get(tv.name, float('-inf'))
+            )
+            if now - idle_since >= suspend_delay:
+                self._suspend_tv(tv)
+                return
+        else:
+            self._standby_since.pop(tv.name, None)
+        
+        if now < self._next_poll.get(tv.name, 0):
+            return
+        self._next_poll[tv.name] = now + self._poll_interval(tv, now)
+        # Pushed notifications keep a subscribed TV fresh, poll only once it goes quiet
+        silent = not tv.last_seen or time.time() - tv.last_seen >= self.config['push_silence_timeout']
+        if not tv.subscribed or silent:
+            # The answer is published by the on_state_update callback
+            tv._request_state()
+
+    def request_reload(self):
+        """Ask the reload thread to re-read the configuration (signal-safe)"""
+        self._reload_requested.set()
+
+    def _options_file_mtime(self) -> Optional[float]:
+        if not self.options_path:
+            return None
+        try:
+            return os.stat(self.options_path).st_mtime
+        except OSError:
+            return None
+
+    def _check_options_file(self):
+        """Reload when the add-on options file was rewritten"""
+        mtime = self._options_file_mtime()
+        if mtime != self._options_mtime:
+            self._options_mtime = mtime
+            if mtime is not None:
+                self.request_reload()
+
+    def _reload_loop(self):
+        while self.running:
+            self._reload_requested.wait()
+            if not self.running:
+                return
+            self._reload_requested.clear()
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"❌ Config reload error: {e}", exc_info=True)
+
+    def reload(self) -> bool:
+        """
+        Re-read the configuration (environment overlaid with the add-on
+        options file) and apply only what changed: added, removed or
+        re-addressed TVs, MQTT connection settings, logging and tunables.
+        An invalid configuration is rejected and the running one kept.
+        """
+        try:
+            environ = dict(os.environ)
+            if self.options_path and os.path.exists(self.options_path):
+                environ.update(read_options(self.options_path))
+            config = load_config(environ)
+            tv_configs = validate_tv_configs(config)
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Config reload rejected, keeping the running configuration: {e}")
+            return False
+        
+        changed = sorted(key for key in config if self._setting(self.config, key) != self._setting(config, key))
+        restart = [key for key in changed if key in self.RESTART_KEYS]
+        for key in restart:
+            config[key] = self.config[key]
+        if restart:
+            logger.warning(f"⚠️ Changes to {', '.join(restart)} take effect after a restart")
+        old, self.config = self.config, config
+        
+        if {'log_level', 'log_format', 'log_debug_sample'} & set(changed):
+            setup_logging(config)
+        self.publisher.maxsize = config['mqtt_buffer_size']
+        self.publisher.max_inflight = config['mqtt_max_inflight']
+        self.publisher.expiry['heartbeat'] = config['heartbeat_interval']
+        self.supervisor.max_delay = config['reconnect_max_delay']
+        if self.scanner:
+            self.scanner.interval = config['network_scan_interval']
+        for queue in list(self.command_queues.values()):
+            queue.maxsize = config['command_queue_size']
+        for tv in list(self.tvs.values()):
+            tv.subscribe = bool(config['push_silence_timeout'])
+            tv.ping_interval = config['ws_ping_interval']
+            tv.ping_timeout = config['ws_ping_timeout']
+        
+        self._apply_tv_configs(tv_configs)
+        if any(old[key] != config[key] for key in self.MQTT_CONNECTION_KEYS):
+            self._restart_mqtt()
+        elif config['auto_discovery'] and not old['auto_discovery']:
+            self._resync_discovery()
+        
+        applied = [key for key in changed if key not in restart]
+        logger.info(f"🔄 Configuration reloaded{': ' + ', '.join(applied) if applied else ', nothing changed'}")
+        return True
+
+    @staticmethod
+    def _setting(config: Dict[str, Any], key: str) -> Any:
+        """Value of a setting as compared on reload: TVS parsed, whatever its JSON spacing"""
+        value = config.get(key)
+        if key == 'tvs' and value:
+            try:
+                return json.loads(value)
+            except ValueError:
+                pass
+        return value
+
+    def _apply_tv_configs(self, tv_configs: List[Dict[str, Any]]):
+        """Diff the configured TVs against the running ones"""
+        wanted = {tv['name']: tv for tv in tv_configs}
+        for name in list(self._configured):
+            if name not in wanted:
+                self._configured.discard(name)
+                self.remove_tv(name)
+        for name, tv_config in wanted.items():
+            self._configured.add(name)
+            current = self.tv_configs.get(name)
+            if current is None:
+                self.add_tv(tv_config)
+            elif current != tv_config:
+                self._update_tv(name, tv_config)
+
+    def _update_tv(self, tv_name: str, tv_config: Dict[str, Any]):
+        """Apply new settings to a running TV, reconnecting only if its endpoint moved"""
+        current = self.tv_configs[tv_name]
+        if not tv_config['mac']:
+            tv_config = dict(tv_config, mac=current.get('mac', ''))  # Keep a learnt MAC
+        self.tv_configs[tv_name] = tv_config
+        
+        queue = self.command_queues.get(tv_name)
+        if queue and tv_config['command_rate'] != current['command_rate']:
+            rate = tv_config['command_rate']
+            queue.min_interval = 1.0 / rate if rate > 0 else 0
+        tv = self.tvs.get(tv_name)
+        if tv is None:
+            return
+        tv.mac = tv_config['mac']
+        if any(tv_config[key] != current[key] for key in ('ip', 'port', 'ssl')):
+            logger.info(f"🔄 TV {tv_name} endpoint changed to {tv_config['ip']}:{tv_config['port']}, reconnecting")
+            tv.ip = tv_config['ip']
+            tv.port = tv_config['port']
+            tv.use_ssl = tv_config['ssl']
+            self.suspended.discard(tv_name)
+            if self.running:
+                self.supervisor.schedule(tv_name, delay=0, reset=True)
+
+    def _restart_mqtt(self):
+        """Reconnect to the broker with new connection settings"""
+        logger.info("🔄 MQTT settings changed, reconnecting to the broker")
+        client = self.mqtt_client
+        if client:
+            client.loop_stop()
+            client.disconnect()
+            self.publisher.on_disconnect()
+        if not self.setup_mqtt(background=True):
+            logger.error("❌ MQTT setup failed, bridge is off MQTT until the next reload")
+
     def state_monitor(self):
-        """Monitor TV state and publish updates"""
-        logger.info("📊 Starting state monitoring")
+        """Monitor TV states and publish updates"""
+        logger.info(f"📊 Starting state monitoring for {len(self.tv_configs)} TV(s)")
         
         while self.running:
             try:
-                if self.tv and self.tv.connected:
-                    self.tv._request_state()
-                    time.sleep(1)
-                    self._publish_state()
-                else:
-                    logger.warning("⚠️ TV disconnected, attempting reconnection...")
-                    if self.mqtt_client:
-                        self.mqtt_client.publish(
-                            self.availability_topic,
-                            "offline",
-                            qos=1,
-                            retain=True
-                        )
-                    
-                    if self.setup_tv():
-                        if self.mqtt_client:
-                            self.mqtt_client.publish(
-                                self.availability_topic,
-                                "online",
-                                qos=1,
-                                retain=True
-                            )
+                now = time.monotonic()
+                for tv in list(self.tvs.values()):
+                    self._publish_heartbeat(tv)
+                    self._check_session(tv, now)
+                self._check_options_file()
                 
-                time.sleep(self.config['scan_interval'])
+                self._stop_event.wait(self.MONITOR_TICK)
                 
             except Exception as e:
                 logger.error(f"❌ State monitoring error: {e}")
-                time.sleep(self.config['scan_interval'])
+                self._stop_event.wait(self.config['scan_interval'])
 
     def run(self) -> bool:
         """Start the bridge"""
         logger.info("=" * 60)
         logger.info("🚀 Starting Hisense TV MQTT Bridge")
         logger.info("=" * 60)
+        started = time.monotonic()
         
         self.running = True
+        self._stop_event.clear()
+        
+        for queue in self.command_queues.values():
+            queue.start()
+        
+        # Warm start before MQTT comes up so restored state is published at once
+        self.snapshot.start()
+        for name in self.tv_configs:
+            self._get_tv(name)
+        
+        if self.config['metrics_port']:
+            try:
+                self.metrics_server = MetricsServer(self.config['metrics_port'])
+                self.metrics_server.start()
+            except OSError as e:
+                logger.error(f"❌ Metrics server error: {e}")
         
         # Setup MQTT
         if not self.setup_mqtt():
             logger.error("❌ MQTT setup failed")
             return False
         
-        # Setup TV
-        if not self.setup_tv():
-            logger.error("❌ TV setup failed")
-            return False
+        # Setup TVs
+        self.supervisor.start()
+        self.setup_tvs()
+        if self.config['power_probe_interval']:
+            self.power_prober.start()
+        if self.scanner:
+            self.scanner.start()
         
         # Start monitoring
         monitor_thread = Thread(target=self.state_monitor, daemon=True)
         monitor_thread.start()
+        Thread(target=self._reload_loop, name='config-reload', daemon=True).start()
         
-        logger.info("✅ Bridge started successfully")
+        logger.info(f"✅ Bridge started successfully in {(time.monotonic() - started) * 1000:.0f} ms")
         
         try:
-            while self.running:
-                time.sleep(1)
+            self._stop_event.wait()
         except KeyboardInterrupt:
             logger.info("🛑 Shutdown requested")
             self.stop()
@@ -815,19 +3718,30 @@ class MQTTBridge:
         logger.info("🛑 Stopping bridge...")
         
         self.running = False
+        self._stop_event.set()
+        self._reload_requested.set()
         
         if self.mqtt_client:
-            self.mqtt_client.publish(
-                self.availability_topic,
-                "offline",
-                qos=1,
-                retain=True
-            )
+            for name in list(self.tv_configs):
+                self._publish_availability(name, False)
+            self.publisher.publish(self.bridge_availability_topic, "offline", 'availability')
             self.mqtt_client.loop_stop()
             self.mqtt_client.disconnect()
         
-        if self.tv:
-            self.tv.disconnect()
+        for queue in list(self.command_queues.values()):
+            queue.stop()
+        
+        self.supervisor.stop()
+        self.power_prober.stop()
+        if self.scanner:
+            self.scanner.stop()
+        
+        if self.metrics_server:
+            self.metrics_server.stop()
+        
+        for tv in list(self.tvs.values()):
+            tv.disconnect()
+        self.snapshot.stop()
         
         logger.info("✅ Bridge stopped")
 
@@ -838,8 +3752,20 @@ class MQTTBridge:
 
 def main():
     """Main entry point"""
+    config = load_config()
+    setup_logging(config)
+    try:
+        tv_configs = validate_tv_configs(config)
+    except ValueError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
+    for tv_config in tv_configs:
+        logger.info(f"✅ Configuration loaded - TV {tv_config['name']}: {tv_config['ip']}:{tv_config['port']}")
+    
     try:
-        bridge = MQTTBridge(CONFIG)
+        bridge = MQTTBridge(config, tv_configs)
+        signal.signal(signal.SIGTERM, lambda signum, frame: bridge.stop())
+        signal.signal(signal.SIGHUP, lambda signum, frame: bridge.request_reload())
         bridge.run()
     except Exception as e:
         logger.error(f"❌ Fatal error: {e}", exc_info=True)
@@ -11,16 +11,43 @@ export MQTT_PORT=$(bashio::config 'mqtt_port')
 export MQTT_USER=$(bashio::config 'mqtt_user')
 export MQTT_PASSWORD=$(bashio::config 'mqtt_password')
 export MQTT_TOPIC_PREFIX=$(bashio::config 'mqtt_topic_prefix')
+export MQTT_BUFFER_SIZE=$(bashio::config 'mqtt_buffer_size')
+export MQTT_MAX_INFLIGHT=$(bashio::config 'mqtt_max_inflight')
+export MQTT_PROTOCOL=$(bashio::config 'mqtt_protocol')
+export MQTT_SHARED_GROUP=$(bashio::config 'mqtt_shared_group')
+export MQTT_CLIENT_ID=$(bashio::config 'mqtt_client_id')
 export TV_IP=$(bashio::config 'tv_ip')
 export TV_PORT=$(bashio::config 'tv_port')
 export TV_NAME=$(bashio::config 'tv_name')
 export TV_SSL=$(bashio::config 'tv_ssl')
+export TV_MAC=$(bashio::config 'tv_mac')
 export AUTO_DISCOVERY=$(bashio::config 'auto_discovery')
 export SCAN_INTERVAL=$(bashio::config 'scan_interval')
 export LOG_LEVEL=$(bashio::config 'log_level')
+export LOG_FORMAT=$(bashio::config 'log_format')
+export LOG_DEBUG_SAMPLE=$(bashio::config 'log_debug_sample')
+export HEARTBEAT_INTERVAL=$(bashio::config 'heartbeat_interval')
+export COMMAND_RATE=$(bashio::config 'command_rate')
+export COMMAND_QUEUE_SIZE=$(bashio::config 'command_queue_size')
+export METRICS_PORT=$(bashio::config 'metrics_port')
+export RECONNECT_MAX_DELAY=$(bashio::config 'reconnect_max_delay')
+export RECONNECT_CONCURRENCY=$(bashio::config 'reconnect_concurrency')
+export POWER_PROBE_INTERVAL=$(bashio::config 'power_probe_interval')
+export ACTIVE_SCAN_INTERVAL=$(bashio::config 'active_scan_interval')
+export STANDBY_SUSPEND_DELAY=$(bashio::config 'standby_suspend_delay')
+export STANDBY_SCAN_INTERVAL=$(bashio::config 'standby_scan_interval')
+export PUSH_SILENCE_TIMEOUT=$(bashio::config 'push_silence_timeout')
+export WOL_BROADCAST=$(bashio::config 'wol_broadcast')
+export WS_PING_INTERVAL=$(bashio::config 'ws_ping_interval')
+export WS_PING_TIMEOUT=$(bashio::config 'ws_ping_timeout')
+export LIVENESS_TIMEOUT=$(bashio::config 'liveness_timeout')
+export NETWORK_DISCOVERY=$(bashio::config 'network_discovery')
+export NETWORK_SCAN_CIDR=$(bashio::config 'network_scan_cidr')
+export NETWORK_SCAN_INTERVAL=$(bashio::config 'network_scan_interval')
+export TVS=$(jq -c '.tvs // []' "${CONFIG_PATH}")
 
 # Validation des paramètres obligatoires
-if bashio::var.is_empty "${TV_IP}"; then
+if bashio::var.is_empty "${TV_IP}" && [ "${TVS}" = "[]" ] && ! bashio::var.true "${NETWORK_DISCOVERY}"; then
     bashio::log.fatal "L'adresse IP de la TV est obligatoire!"
     exit 1
 fi
@@ -37,6 +64,7 @@ bashio::log.info "- TV Name: ${TV_NAME}"
 bashio::log.info "- TV SSL: ${TV_SSL}"
 bashio::log.info "- Topic prefix: ${MQTT_TOPIC_PREFIX}"
 bashio::log.info "- Auto-discovery: ${AUTO_DISCOVERY}"
+bashio::log.info "- Découverte réseau: ${NETWORK_DISCOVERY}"
 
 # Lancement du script Python
 bashio::log.info "Démarrage du bridge..."
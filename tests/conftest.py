@@ -0,0 +1,8 @@
+"""Make the add-on module and the tools importable from the tests"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+sys.path.insert(0, os.path.join(ROOT, 'hisense_mqtt_bridge', 'rootfs', 'app'))
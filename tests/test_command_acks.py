@@ -0,0 +1,62 @@
+"""MQTT v5 command acknowledgements: answered, no-op and failed commands"""
+
+import json
+
+import pytest
+
+from hisense_mqtt_bridge import CommandReply, MQTTBridge, load_config, validate_tv_configs
+
+REPLY = [CommandReply('reply/1', b'1')]
+
+
+class FakeSocket:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sent = []
+
+    def send(self, frame):
+        if self.fail:
+            raise OSError('connection reset')
+        self.sent.append(frame)
+
+
+@pytest.fixture
+def bridge(tmp_path):
+    config = load_config({'DATA_DIR': str(tmp_path),
+                          'TVS': json.dumps([{'name': 'tv', 'ip': '127.0.0.1'}])})
+    bridge = MQTTBridge(config, validate_tv_configs(config))
+    bridge.acks = []
+    bridge._acknowledge = lambda replies, name, command, payload, status, rtt=None, reason=None: \
+        bridge.acks.append((command, payload, status, reason))
+    tv = bridge._get_tv('tv')
+    tv.connected = True
+    tv.ws = FakeSocket()
+    tv.state_received = True
+    tv.state.update(power='ON', muted=False)
+    return bridge
+
+
+def test_nothing_to_send_acks_no_op(bridge):
+    tv = bridge.tvs['tv']
+    bridge._process_command(tv, 'power', 'on', REPLY)
+    bridge._process_command(tv, 'mute', 'off', REPLY)
+    assert bridge.acks == [('power', 'on', 'ok', 'no-op'), ('mute', 'off', 'ok', 'no-op')]
+    assert tv.ws.sent == []
+    assert tv._pending == []
+
+
+def test_sent_command_acked_when_answered(bridge):
+    tv = bridge.tvs['tv']
+    bridge._process_command(tv, 'mute', 'on', REPLY)
+    assert len(tv.ws.sent) == 1
+    assert bridge.acks == []
+    tv._resolve_pending({'action': 'state', 'muted': True})
+    assert bridge.acks == [('mute', 'on', 'ok', None)]
+
+
+def test_failed_send_acks_error(bridge):
+    tv = bridge.tvs['tv']
+    tv.ws = FakeSocket(fail=True)
+    bridge._process_command(tv, 'volume', '20', REPLY)
+    assert bridge.acks == [('volume', '20', 'error', None)]
+    assert tv._pending == []
@@ -0,0 +1,116 @@
+"""CommandQueue coalescing: what merges, and where the result runs"""
+
+import json
+
+from hisense_mqtt_bridge import (CommandQueue, CommandReply, MQTTBridge, QueuedCommand,
+                                 load_config, validate_tv_configs)
+
+
+def queued(commands, maxsize=32):
+    queue = CommandQueue('tv', lambda command: None, maxsize=maxsize)
+    for command, payload in commands:
+        queue.put(command, payload)
+    return [(item.command, item.payload, item.volume_delta) for item in queue._queue]
+
+
+def test_absolute_channel_supersedes_queued_one():
+    assert queued([('channel', '5'), ('channel', '7')]) == [('channel', '7', 0)]
+
+
+def test_channel_not_merged_across_relative_step():
+    # channel up depends on channel 5 having been applied first
+    assert queued([('channel', '5'), ('channel', 'up'), ('channel', '7')]) == [
+        ('channel', '5', 0), ('channel', 'up', 0), ('channel', '7', 0)]
+
+
+def test_merge_into_latest_entry():
+    assert queued([('source', 'hdmi1'), ('channel', 'up'), ('source', 'hdmi2'), ('source', 'tv')]) == [
+        ('source', 'hdmi1', 0), ('channel', 'up', 0), ('source', 'tv', 0)]
+
+
+def test_merge_across_independent_commands():
+    assert queued([('channel', '5'), ('volume', 'up'), ('channel', '7')]) == [
+        ('channel', '7', 0), ('volume', 'up', 1)]
+    assert queued([('volume', 'up'), ('channel', '3'), ('volume', 'up')]) == [
+        ('volume', 'up', 2), ('channel', '3', 0)]
+
+
+def test_volume_steps_accumulate():
+    assert queued([('volume', 'up'), ('volume', 'up'), ('volume', 'down'), ('volume', 'up')]) == [
+        ('volume', 'up', 2)]
+    assert queued([('volume', '30'), ('volume', 'up'), ('volume', 'up')]) == [('volume', '32', 0)]
+    assert queued([('volume', 'up'), ('volume', '10')]) == [('volume', '10', 0)]
+
+
+def test_volume_steps_cancel_out():
+    assert queued([('volume', 'up'), ('volume', 'down')]) == [('volume', 'up', 0)]
+    assert queued([('volume', 'down'), ('volume', 'up'), ('volume', 'up')]) == [('volume', 'down', 1)]
+
+
+def test_cancelled_volume_steps_send_nothing(tmp_path):
+    config = load_config({'DATA_DIR': str(tmp_path),
+                          'TVS': json.dumps([{'name': 'tv', 'ip': '127.0.0.1'}])})
+    bridge = MQTTBridge(config, validate_tv_configs(config))
+    tv = bridge._get_tv('tv')
+    sent = []
+    tv.connected = True
+    tv.ws = type('FakeSocket', (), {'send': lambda self, frame: sent.append(frame)})()
+    acks = []
+    bridge._acknowledge = lambda replies, name, command, payload, status, rtt=None, reason=None: \
+        acks.append((command, payload, status, reason))
+
+    queue = CommandQueue('tv', bridge._make_executor('tv'))
+    queue.put('volume', 'up', CommandReply('reply/1', b'1'))
+    queue.put('volume', 'down', CommandReply('reply/2', b'2'))
+    queue.execute(queue._queue.popleft())
+    assert sent == []
+    assert acks == [('volume', 'up', 'ok', 'no-op')]
+
+    step = QueuedCommand('volume', 'down')
+    step.volume_delta = -1
+    queue.execute(step)
+    assert len(sent) == 1 and b'KEY_VOLUMEDOWN' in sent[0]
+
+
+def test_volume_not_merged_across_mute():
+    # A volume key unmutes: the order against mute matters
+    assert queued([('volume', 'up'), ('mute', 'on'), ('volume', 'up')]) == [
+        ('volume', 'up', 1), ('mute', 'on', 0), ('volume', 'up', 1)]
+
+
+def test_power_merges_only_at_the_tail():
+    assert queued([('power', 'on'), ('power', 'off')]) == [('power', 'off', 0)]
+    assert queued([('power', 'on'), ('volume', '5'), ('power', 'off')]) == [
+        ('power', 'on', 0), ('volume', '5', 0), ('power', 'off', 0)]
+
+
+def test_keys_are_never_merged():
+    assert queued([('key', 'KEY_OK'), ('key', 'KEY_OK')]) == [
+        ('key', 'KEY_OK', 0), ('key', 'KEY_OK', 0)]
+
+
+def test_merged_command_keeps_every_requester():
+    queue = CommandQueue('tv', lambda command: None)
+    first, second = CommandReply('reply/1', b'1'), CommandReply('reply/2', b'2')
+    queue.put('channel', '5', first)
+    queue.put('channel', '7', second)
+    assert len(queue._queue) == 1
+    assert queue._queue[0].replies == [first, second]
+    assert queue.stats()['coalesced'] == 1
+
+
+def test_full_queue_drops_new_commands():
+    queue = CommandQueue('tv', lambda command: None, maxsize=2)
+    assert queue.put('key', 'KEY_UP')
+    assert queue.put('key', 'KEY_DOWN')
+    assert not queue.put('key', 'KEY_OK')
+    assert queue.stats()['dropped'] == 1
+
+
+def test_full_queue_still_merges():
+    queue = CommandQueue('tv', lambda command: None, maxsize=2)
+    queue.put('volume', 'up')
+    queue.put('channel', '3')
+    assert queue.put('volume', 'up')
+    assert queue._queue[0].volume_delta == 2
+    assert queue.stats()['dropped'] == 0
@@ -0,0 +1,83 @@
+"""HisenseTV inbound frame classification: one decode path per frame"""
+
+import base64
+import json
+import textwrap
+
+import pytest
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+
+import hisense_mqtt_bridge
+from hisense_mqtt_bridge import HisenseTV
+
+STATE = {'action': 'state', 'power': 'ON', 'volume': 12, 'source': 'HDMI1', 'app': 'x' * 80}
+
+
+@pytest.fixture
+def tv():
+    tv = HisenseTV('127.0.0.1', name='tv')
+    tv.processed = []
+    tv._process_message = tv.processed.append
+    return tv
+
+
+def encrypt(tv, message) -> str:
+    cipher = AES.new(tv.cipher_key, AES.MODE_CBC, tv.cipher_iv)
+    return base64.b64encode(cipher.encrypt(pad(json.dumps(message).encode(), 16))).decode()
+
+
+def test_json(tv):
+    tv._on_message(None, json.dumps(STATE))
+    tv._on_message(None, ' \n' + json.dumps(STATE))
+    tv._on_message(None, json.dumps(STATE).encode())
+    assert tv.processed == [STATE] * 3
+
+
+def test_json_array(tv):
+    tv._on_message(None, json.dumps([STATE, 1, STATE]))
+    assert tv.processed == [STATE, STATE]
+
+
+def test_encrypted(tv):
+    frame = encrypt(tv, STATE)
+    tv._on_message(None, frame)
+    tv._on_message(None, frame.encode())
+    assert tv.processed == [STATE] * 2
+
+
+def test_encrypted_line_wrapped(tv):
+    frame = '\n'.join(textwrap.wrap(encrypt(tv, STATE), 76)) + '\r\n'
+    tv._on_message(None, frame)
+    assert tv.processed == [STATE]
+
+
+@pytest.mark.parametrize('frame', ['', '   ', 'not a frame!', b'\xff\xfe'])
+def test_garbage_ignored(tv, frame):
+    tv._on_message(None, frame)
+    assert tv.processed == []
+
+
+def test_malformed_json_parsed_once(tv, monkeypatch):
+    calls = []
+
+    def counting_loads(data):
+        calls.append(data)
+        return json.loads(data)
+
+    monkeypatch.setattr(hisense_mqtt_bridge, 'json_loads', counting_loads)
+    decrypts = []
+    monkeypatch.setattr(tv, '_try_decrypt_message', lambda message: decrypts.append(message))
+    tv._on_message(None, '{"power": "ON"')
+    assert len(calls) == 1
+    assert decrypts == []
+    assert tv.processed == []
+
+
+def test_undecryptable_base64_decrypted_once(tv, monkeypatch):
+    decrypts = []
+    original = tv.cipher.decrypt
+    monkeypatch.setattr(tv.cipher, 'decrypt', lambda data: decrypts.append(data) or original(data))
+    tv._on_message(None, base64.b64encode(b'\0' * 32).decode())
+    assert len(decrypts) == 1
+    assert tv.processed == []
@@ -0,0 +1,54 @@
+"""PayloadCipher against pycryptodome's own AES-128-CBC"""
+
+import os
+
+import pytest
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+
+from hisense_mqtt_bridge import PayloadCipher
+
+KEY = bytes.fromhex('2b7e151628aed2a6abf7158809cf4f3c')
+IV = bytes.fromhex('000102030405060708090a0b0c0d0e0f')
+
+
+def encrypt(plaintext: bytes, key: bytes = KEY, iv: bytes = IV) -> bytes:
+    return AES.new(key, AES.MODE_CBC, iv).encrypt(pad(plaintext, AES.block_size))
+
+
+def test_known_answer():
+    # NIST SP 800-38A F.2.1, CBC-AES128 block 1 followed by a full padding block
+    plaintext = bytes.fromhex('6bc1bee22e409f96e93d7e117393172a')
+    ciphertext = encrypt(plaintext)
+    assert ciphertext[:16] == bytes.fromhex('7649abac8119b246cee98e9b12e9197d')
+    assert PayloadCipher(KEY, IV).decrypt(ciphertext) == plaintext
+
+
+@pytest.mark.parametrize('size', [0, 1, 15, 16, 17, 31, 32, 300, 5000])
+def test_round_trip(size):
+    plaintext = os.urandom(size)
+    assert PayloadCipher(KEY, IV).decrypt(encrypt(plaintext)) == plaintext
+
+
+def test_cipher_is_reusable():
+    cipher = PayloadCipher(KEY, IV)
+    for message in (b'{"action": "state"}', b'x' * 100, b'{}'):
+        assert cipher.decrypt(encrypt(message)) == message
+
+
+def test_other_keys():
+    key, iv = os.urandom(16), os.urandom(16)
+    message = b'{"power": "ON", "volume": 12}'
+    assert PayloadCipher(key, iv).decrypt(encrypt(message, key, iv)) == message
+    assert PayloadCipher(KEY, IV).decrypt(encrypt(message, key, iv)) != message
+
+
+@pytest.mark.parametrize('data', [b'', b'x' * 15, b'x' * 17])
+def test_invalid_length(data):
+    assert PayloadCipher(KEY, IV).decrypt(data) is None
+
+
+def test_invalid_padding():
+    # A block whose plaintext ends in 0x00 is never valid PKCS#7
+    ciphertext = AES.new(KEY, AES.MODE_CBC, IV).encrypt(b'a' * 15 + b'\x00')
+    assert PayloadCipher(KEY, IV).decrypt(ciphertext) is None
@@ -0,0 +1,143 @@
+"""PublishPipeline MQTT v5 topic alias path, against the broker stub"""
+
+import time
+from threading import Event
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from hisense_mqtt_bridge import PublishPipeline
+from mqtt_broker_stub import MQTTBrokerStub
+
+TOPIC = 'hisense_tv/tv/state/volume'
+
+
+def wait_for(predicate, timeout=5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+class Harness:
+    """A v5 client wired to a pipeline the way MQTTBridge wires it"""
+
+    def __init__(self, topic_alias_maximum=10):
+        self.broker = MQTTBrokerStub(topic_alias_maximum=topic_alias_maximum)
+        self.port = self.broker.start()
+        self.received = []
+        self.broker.on_publish = lambda topic, payload, retain: self.received.append((topic, payload))
+        self.pipeline = PublishPipeline(max_inflight=20)
+        self.client = mqtt.Client(client_id='pipeline-test', protocol=mqtt.MQTTv5)
+        self.client.reconnect_delay_set(0.05, 0.2)
+        self.pipeline.attach(self.client, mqtt5=True)
+        self.connects = 0
+        self.connected = Event()
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = lambda client, userdata, rc, properties=None: self.pipeline.on_disconnect()
+        self.client.connect('127.0.0.1', self.port)
+        self.client.loop_start()
+        assert self.connected.wait(5)
+
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
+        self.connects += 1
+        self.pipeline.on_connect(getattr(properties, 'TopicAliasMaximum', 0))
+        self.connected.set()
+
+    def session(self):
+        return self.broker._sessions[0]
+
+    def restart_broker(self):
+        """Replace the broker by a fresh one on the same port"""
+        self.broker.stop()
+        connects = self.connects
+        self.broker = MQTTBrokerStub(port=self.port)
+        self.broker.on_publish = lambda topic, payload, retain: self.received.append((topic, payload))
+        self.broker.start()
+        assert wait_for(lambda: self.connects > connects)
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.broker.stop()
+
+
+@pytest.fixture
+def harness():
+    created = []
+
+    def make(**kwargs):
+        created.append(Harness(**kwargs))
+        return created[-1]
+
+    yield make
+    for item in created:
+        item.close()
+
+
+def test_hot_topic_sent_by_alias(harness):
+    h = harness()
+    for value in range(5):
+        assert h.pipeline.publish(TOPIC, str(value), 'state')
+    assert wait_for(lambda: len(h.received) == 5)
+    # The stub resolves aliases: every message arrives under its full topic
+    assert h.received == [(TOPIC, str(value).encode()) for value in range(5)]
+    assert h.session().aliases == {1: TOPIC}
+    assert h.pipeline._aliases == {TOPIC: 1}
+    assert h.broker.retained[TOPIC] == b'4'
+
+
+def test_one_alias_per_topic(harness):
+    h = harness()
+    topics = [f'hisense_tv/tv/state/{field}' for field in ('power', 'volume', 'muted')]
+    for _ in range(2):
+        for topic in topics:
+            h.pipeline.publish(topic, 'x', 'state')
+    assert wait_for(lambda: len(h.received) == 6)
+    assert h.session().aliases == {1: topics[0], 2: topics[1], 3: topics[2]}
+
+
+def test_aliases_limited_by_broker_maximum(harness):
+    h = harness(topic_alias_maximum=1)
+    for topic in ('a/state', 'b/state', 'b/state'):
+        h.pipeline.publish(topic, '1', 'state')
+    assert wait_for(lambda: len(h.received) == 3)
+    assert [topic for topic, _ in h.received] == ['a/state', 'b/state', 'b/state']
+    assert h.pipeline._aliases == {'a/state': 1}
+
+
+def test_no_aliases_when_broker_refuses_them(harness):
+    h = harness(topic_alias_maximum=0)
+    for value in range(3):
+        h.pipeline.publish(TOPIC, str(value), 'state')
+    assert wait_for(lambda: len(h.received) == 3)
+    assert h.session().aliases == {}
+    assert h.pipeline._aliases == {}
+
+
+def test_other_kinds_never_aliased(harness):
+    h = harness()
+    h.pipeline.publish('hisense_tv/bridge/availability', 'online', 'availability')
+    h.pipeline.publish('hisense_tv/bridge/availability', 'online', 'availability')
+    assert wait_for(lambda: len(h.received) == 2)
+    assert h.session().aliases == {}
+
+
+def test_aliases_remapped_after_reconnect(harness):
+    h = harness()
+    # Unacked alias-only messages are resent by paho on the new connection,
+    # where the alias must be mapped again before they arrive
+    h.broker.frozen = True
+    for value in range(3):
+        h.pipeline.publish(TOPIC, str(value), 'state')
+    assert wait_for(lambda: len(h.pipeline._inflight) == 3)
+    h.received.clear()
+    h.restart_broker()
+    assert wait_for(lambda: h.broker.retained.get(TOPIC) == b'2')
+    assert h.session().aliases == {1: TOPIC}
+    # The new table keeps working for later messages
+    h.pipeline.publish(TOPIC, '3', 'state')
+    assert wait_for(lambda: h.broker.retained.get(TOPIC) == b'3')
+    assert all(topic == TOPIC for topic, _ in h.received)
@@ -0,0 +1,100 @@
+"""ReconnectSupervisor backoff, jitter and reset"""
+
+import time
+from threading import Event
+
+import pytest
+
+from hisense_mqtt_bridge import ReconnectSupervisor
+
+
+def make_supervisor(connect, on_result=lambda name, success: None, **kwargs):
+    options = dict(first_delay=0.01, base_delay=0.01, max_delay=0.04)
+    options.update(kwargs)
+    return ReconnectSupervisor(connect, on_result, **options)
+
+
+def test_first_retry_is_fast():
+    supervisor = make_supervisor(lambda name: True, first_delay=0.5, base_delay=2, max_delay=300)
+    assert all(0 <= supervisor.next_delay('tv') <= 0.5 for _ in range(200))
+
+
+@pytest.mark.parametrize('attempts, delay', [(1, 2), (2, 4), (3, 8), (6, 64), (9, 300), (30, 300)])
+def test_backoff_doubles_with_jitter_up_to_max(attempts, delay):
+    supervisor = make_supervisor(lambda name: True, first_delay=0.5, base_delay=2, max_delay=300)
+    supervisor.attempts['tv'] = attempts
+    delays = [supervisor.next_delay('tv') for _ in range(200)]
+    assert all(delay / 2 <= value <= delay for value in delays)
+    # Jittered: TVs dropping together do not retry in lockstep
+    assert len(set(delays)) > 1
+
+
+def test_retries_until_connected_then_resets():
+    results = []
+    done = Event()
+
+    def connect(name):
+        return len(results) >= 3
+
+    def on_result(name, success):
+        results.append(success)
+        if success:
+            done.set()
+
+    supervisor = make_supervisor(connect, on_result)
+    supervisor.start()
+    try:
+        supervisor.schedule('tv')
+        assert done.wait(5)
+    finally:
+        supervisor.stop()
+    assert results == [False, False, False, True]
+    assert 'tv' not in supervisor.attempts
+
+
+def test_failures_count_attempts():
+    failures = Event()
+
+    def on_result(name, success):
+        if supervisor.attempts.get(name, 0) >= 3:
+            failures.set()
+
+    supervisor = make_supervisor(lambda name: False, on_result)
+    supervisor.start()
+    try:
+        supervisor.schedule('tv')
+        assert failures.wait(5)
+    finally:
+        supervisor.stop()
+    assert supervisor.attempts['tv'] >= 3
+
+
+def test_reset_restarts_backoff():
+    supervisor = make_supervisor(lambda name: True, first_delay=0.5, base_delay=2, max_delay=300)
+    supervisor.attempts['tv'] = 8
+    supervisor.schedule('tv', reset=True)
+    assert 'tv' not in supervisor.attempts
+    assert supervisor._scheduled['tv'] - time.monotonic() <= 0.5
+
+
+def test_earlier_attempt_wins():
+    supervisor = make_supervisor(lambda name: True)
+    supervisor.schedule('tv', delay=10)
+    supervisor.schedule('tv', delay=60)
+    assert supervisor._scheduled['tv'] - time.monotonic() <= 10
+    supervisor.schedule('tv', delay=0)
+    assert supervisor._scheduled['tv'] - time.monotonic() <= 0
+
+
+def test_cancel_drops_pending_attempt():
+    attempted = Event()
+    supervisor = make_supervisor(lambda name: attempted.set() or True)
+    supervisor.start()
+    try:
+        supervisor.schedule('tv', delay=0.2)
+        supervisor.attempts['tv'] = 4
+        supervisor.cancel('tv')
+        assert not attempted.wait(0.5)
+    finally:
+        supervisor.stop()
+    assert 'tv' not in supervisor.attempts
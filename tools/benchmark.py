@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+End-to-end benchmark for hisense_mqtt_bridge.py
+Runs the bridge as a subprocess against simulated Vidaa-U TVs and the
+in-process MQTT broker stub, then reports:
+- command -> TV latency percentiles (MQTT publish to frame received by the TV)
+- state -> MQTT latency percentiles (TV notification to state topic on broker)
+- command throughput (messages/s)
+- bridge CPU time and RSS per TV
+- bytes received by the broker from the bridge and the benchmark client
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import logging
+from threading import Event, Lock
+from typing import Dict, List, Any
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import paho.mqtt.client as mqtt
+
+from vidaa_simulator import SimulatedTV
+from mqtt_broker_stub import MQTTBrokerStub
+
+BRIDGE_SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', 'hisense_mqtt_bridge', 'rootfs', 'app', 'hisense_mqtt_bridge.py'
+)
+PREFIX = 'hisense_tv'
+
+logger = logging.getLogger('Benchmark')
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p90/p99/max in milliseconds"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(fraction: float) -> float:
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return ordered[index] * 1000
+
+    return {
+        'p50': pick(0.50),
+        'p90': pick(0.90),
+        'p99': pick(0.99),
+        'max': ordered[-1] * 1000,
+    }
+
+
+def process_usage(pid: int) -> Dict[str, float]:
+    """CPU seconds (user+system) and RSS in MiB of a process, Linux only"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    ticks = os.sysconf('SC_CLK_TCK')
+    cpu = (int(fields[11]) + int(fields[12])) / ticks
+    rss = 0.0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1]) / 1024
+    return {'cpu': cpu, 'rss': rss}
+
+
+# ============================================================================
+# BENCHMARK RUN
+# ============================================================================
+
+class BenchmarkRun:
+    """One benchmark scenario with `count` simulated TVs"""
+
+    def __init__(self, count: int, args: argparse.Namespace):
+        self.count = count
+        self.args = args
+        self.broker = MQTTBrokerStub()
+        self.tvs: List[SimulatedTV] = []
+        self.bridge: subprocess.Popen = None
+        self.client: mqtt.Client = None
+        self.data_dir = tempfile.mkdtemp(prefix='hisense_bench_')
+
+        # Correlation of in-flight probes: key -> (sent_at, event)
+        self._waiting: Dict[str, List[Any]] = {}
+        self._lock = Lock()
+
+    # ------------------------------------------------------------------
+    # Setup / teardown
+    # ------------------------------------------------------------------
+
+    def start(self):
+        broker_port = self.broker.start()
+        self.broker.on_publish = self._on_broker_publish
+        tv_configs = []
+        for i in range(self.count):
+            tv = SimulatedTV(encrypted=self.args.encrypted, lag=self.args.lag,
+                             drop=self.args.drop, name=f"bench{i}")
+            tv.keep_received = False
+            tv.on_request = self._on_tv_request
+            tv_configs.append({'name': tv.name, 'ip': '127.0.0.1', 'port': tv.start()})
+            self.tvs.append(tv)
+
+        env = dict(os.environ)
+        env.update({
+            'MQTT_BROKER': '127.0.0.1',
+            'MQTT_PORT': str(broker_port),
+            'MQTT_TOPIC_PREFIX': PREFIX,
+            'TVS': json.dumps(tv_configs),
+            'SCAN_INTERVAL': str(self.args.scan_interval),
+            'LOG_LEVEL': 'DEBUG' if self.args.verbose else 'WARNING',
+            'AUTO_DISCOVERY': 'false',
+            'HEARTBEAT_INTERVAL': '0',
+            'COMMAND_RATE': '0',
+            'COMMAND_QUEUE_SIZE': '100000',
+            'DATA_DIR': self.data_dir,
+            'MQTT_PROTOCOL': self.args.mqtt_protocol,
+        })
+        output = None if self.args.verbose else subprocess.DEVNULL
+        self.bridge = subprocess.Popen(
+            [sys.executable, BRIDGE_SCRIPT], env=env, stdout=output, stderr=output
+        )
+
+        self.client = mqtt.Client(client_id='hisense_benchmark')
+        self.client.connect('127.0.0.1', broker_port)
+        self.client.loop_start()
+
+        deadline = time.monotonic() + self.args.startup_timeout
+        started = time.monotonic()
+        while time.monotonic() < deadline:
+            online = sum(
+                self.broker.retained.get(f"{PREFIX}/{tv.name}/availability") == b'online'
+                for tv in self.tvs
+            )
+            if online == self.count:
+                return time.monotonic() - started
+            time.sleep(0.05)
+        raise RuntimeError(f"only {online}/{self.count} TVs came online")
+
+    def stop(self):
+        if self.client:
+            self.client.loop_stop()
+            self.client.disconnect()
+        if self.bridge:
+            self.bridge.terminate()
+            try:
+                self.bridge.wait(10)
+            except subprocess.TimeoutExpired:
+                self.bridge.kill()
+        for tv in self.tvs:
+            tv.stop()
+        self.broker.stop()
+
+    # ------------------------------------------------------------------
+    # Correlation hooks
+    # ------------------------------------------------------------------
+
+    def _arm(self, key: str) -> Event:
+        event = Event()
+        with self._lock:
+            self._waiting[key] = [time.monotonic(), event, None]
+        return event
+
+    def _complete(self, key: str, at: float):
+        with self._lock:
+            entry = self._waiting.get(key)
+        if entry and entry[2] is None:
+            entry[2] = at - entry[0]
+            entry[1].set()
+
+    def _on_tv_request(self, request: Dict[str, Any], received_at: float):
+        keycode = request.get('keycode')
+        if keycode:
+            self._complete(f"key:{keycode}", received_at)
+
+    def _on_broker_publish(self, topic: str, payload: bytes, retain: bool):
+        if topic.endswith('/state/volume'):
+            self._complete(f"state:{topic}:{payload.decode()}", time.monotonic())
+
+    def _result(self, key: str) -> float:
+        with self._lock:
+            return self._waiting.pop(key)[2]
+
+    # ------------------------------------------------------------------
+    # Phases
+    # ------------------------------------------------------------------
+
+    def command_latency(self, rounds: int) -> List[float]:
+        """Sequential commands, MQTT publish -> frame at the TV"""
+        samples = []
+        for i in range(rounds):
+            tv = self.tvs[i % self.count]
+            keycode = f"KEY_BENCH_{i}"
+            event = self._arm(f"key:{keycode}")
+            self.client.publish(f"{PREFIX}/{tv.name}/command/key", keycode)
+            if event.wait(self.args.timeout):
+                samples.append(self._result(f"key:{keycode}"))
+            else:
+                self._result(f"key:{keycode}")
+        return samples
+
+    def state_latency(self, rounds: int) -> List[float]:
+        """TV-originated state change -> state topic published on the broker"""
+        samples = []
+        for i in range(rounds):
+            tv = self.tvs[i % self.count]
+            volume = (tv.state['volume'] + 1) % 101
+            key = f"state:{PREFIX}/{tv.name}/state/volume:{volume}"
+            event = self._arm(key)
+            tv.push_state(volume=volume)
+            if event.wait(self.args.timeout):
+                samples.append(self._result(key))
+            else:
+                self._result(key)
+        return samples
+
+    def throughput(self, messages: int) -> Dict[str, float]:
+        """Flood commands across all TVs, messages/s until all reach the TVs"""
+        remaining = [messages]
+        done = Event()
+        lock = Lock()
+
+        def on_request(request, received_at):
+            if str(request.get('keycode', '')).startswith('KEY_FLOOD'):
+                with lock:
+                    remaining[0] -= 1
+                    if remaining[0] == 0:
+                        done.set()
+
+        for tv in self.tvs:
+            tv.on_request = on_request
+        started = time.monotonic()
+        for i in range(messages):
+            tv = self.tvs[i % self.count]
+            self.client.publish(f"{PREFIX}/{tv.name}/command/key", f"KEY_FLOOD_{i % 200}")
+        completed = done.wait(self.args.timeout * 10)
+        elapsed = time.monotonic() - started
+        for tv in self.tvs:
+            tv.on_request = self._on_tv_request
+        delivered = messages - remaining[0]
+        return {
+            'delivered': delivered,
+            'seconds': elapsed,
+            'rate': delivered / elapsed if elapsed else 0.0,
+            'complete': completed,
+        }
+
+    def run(self) -> Dict[str, Any]:
+        startup = self.start()
+        try:
+            time.sleep(self.args.settle)
+            before = process_usage(self.bridge.pid)
+            bytes_before = self.broker.bytes_in
+            started = time.monotonic()
+            commands = self.command_latency(self.args.rounds)
+            states = self.state_latency(self.args.rounds)
+            flood = self.throughput(self.args.messages)
+            elapsed = time.monotonic() - started
+            after = process_usage(self.bridge.pid)
+            return {
+                'tvs': self.count,
+                'startup_s': startup,
+                'command_to_tv_ms': percentiles(commands),
+                'command_samples': len(commands),
+                'state_to_mqtt_ms': percentiles(states),
+                'state_samples': len(states),
+                'throughput': flood,
+                'cpu_s_per_tv': (after['cpu'] - before['cpu']) / self.count,
+                'cpu_percent': 100 * (after['cpu'] - before['cpu']) / elapsed,
+                'rss_mib': after['rss'],
+                'rss_mib_per_tv': after['rss'] / self.count,
+                'broker_bytes_in': self.broker.bytes_in - bytes_before,
+            }
+        finally:
+            self.stop()
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def print_result(result: Dict[str, Any]):
+    def fmt(stats: Dict[str, float]) -> str:
+        if not stats:
+            return "n/a"
+        return " ".join(f"{k}={v:.2f}" for k, v in stats.items())
+
+    print(f"=== {result['tvs']} TV(s) ===")
+    print(f"  startup           : {result['startup_s']:.2f} s")
+    print(f"  command -> TV     : {fmt(result['command_to_tv_ms'])} ms ({result['command_samples']} samples)")
+    print(f"  state -> MQTT     : {fmt(result['state_to_mqtt_ms'])} ms ({result['state_samples']} samples)")
+    flood = result['throughput']
+    print(f"  throughput        : {flood['rate']:.0f} msg/s "
+          f"({flood['delivered']} in {flood['seconds']:.2f} s{'' if flood['complete'] else ', INCOMPLETE'})")
+    print(f"  bridge CPU        : {result['cpu_percent']:.1f} % ({result['cpu_s_per_tv'] * 1000:.1f} ms per TV)")
+    print(f"  bridge RSS        : {result['rss_mib']:.1f} MiB ({result['rss_mib_per_tv']:.2f} MiB per TV)")
+    print(f"  broker bytes in   : {result['broker_bytes_in'] / 1024:.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hisense MQTT bridge benchmark")
+    parser.add_argument('--tvs', default='1,10,100', help="comma separated TV counts")
+    parser.add_argument('--rounds', type=int, default=200, help="latency samples per phase")
+    parser.add_argument('--messages', type=int, default=2000, help="commands in the throughput phase")
+    parser.add_argument('--encrypted', action='store_true', help="TVs answer with encrypted frames")
+    parser.add_argument('--lag', type=float, default=0.0, help="simulated TV response lag (s)")
+    parser.add_argument('--drop', type=float, default=0.0, help="simulated TV drop probability")
+    parser.add_argument('--scan-interval', type=int, default=30)
+    parser.add_argument('--mqtt-protocol', default='3.1.1', choices=('3.1.1', '5'),
+                        help="MQTT protocol of the bridge")
+    parser.add_argument('--timeout', type=float, default=2.0, help="per-sample timeout (s)")
+    parser.add_argument('--startup-timeout', type=float, default=60.0)
+    parser.add_argument('--settle', type=float, default=1.0, help="idle time before measuring (s)")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    parser.add_argument('--verbose', action='store_true', help="show bridge logs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    results = []
+    for count in [int(c) for c in args.tvs.split(',') if c]:
+        result = BenchmarkRun(count, args).run()
+        results.append(result)
+        if not args.json:
+            print_result(result)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Minimal in-process MQTT 3.1.1 / 5 broker
+Just enough of the protocol for local testing and benchmarking of
+hisense_mqtt_bridge.py: CONNECT/will, SUBSCRIBE with wildcards and shared
+subscriptions, retained messages, QoS 0/1 PUBLISH and PINGREQ. MQTT 5
+clients get inbound topic aliases and their PUBLISH properties (response
+topic, correlation data, message expiry...) forwarded. Not meant for
+production use.
+"""
+
+import sys
+import time
+import struct
+import socket
+import argparse
+import logging
+from threading import Thread, Lock, Event
+from typing import Optional, Dict, List, Tuple, Callable
+
+logger = logging.getLogger('MQTTBrokerStub')
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+MQTT5 = 5
+
+# MQTT 5 property identifiers used by the stub
+TOPIC_ALIAS, TOPIC_ALIAS_MAXIMUM = 0x23, 0x22
+
+# MQTT 5 property identifier -> value encoding
+_BYTE, _TWO, _FOUR, _VARINT, _STRING, _PAIR = range(6)
+_PROPERTY_TYPES = {
+    0x01: _BYTE, 0x02: _FOUR, 0x03: _STRING, 0x08: _STRING, 0x09: _STRING,
+    0x0B: _VARINT, 0x11: _FOUR, 0x12: _STRING, 0x13: _TWO, 0x15: _STRING,
+    0x16: _STRING, 0x17: _BYTE, 0x18: _FOUR, 0x19: _BYTE, 0x1A: _STRING,
+    0x1C: _STRING, 0x1F: _STRING, 0x21: _TWO, 0x22: _TWO, 0x23: _TWO,
+    0x24: _BYTE, 0x25: _BYTE, 0x26: _PAIR, 0x27: _FOUR, 0x28: _BYTE,
+    0x29: _BYTE, 0x2A: _BYTE,
+}
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """MQTT wildcard matching (+ and #)"""
+    filter_parts = topic_filter.split('/')
+    topic_parts = topic.split('/')
+    for i, part in enumerate(filter_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != '+' and part != topic_parts[i]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+def _encode_length(length: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+
+def _encode_string(value: bytes) -> bytes:
+    return struct.pack('!H', len(value)) + value
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    multiplier, value = 1, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            return value, pos
+        multiplier *= 128
+
+
+def _read_properties(data: bytes, pos: int) -> Tuple[List[Tuple[int, bytes]], int]:
+    """MQTT 5 property block -> [(identifier, encoded property)], next position"""
+    length, pos = _read_varint(data, pos)
+    end = pos + length
+    properties = []
+    while pos < end:
+        start = pos
+        identifier = data[pos]
+        pos += 1
+        kind = _PROPERTY_TYPES[identifier]
+        if kind == _VARINT:
+            _, pos = _read_varint(data, pos)
+        elif kind in (_STRING, _PAIR):
+            for _ in range(2 if kind == _PAIR else 1):
+                pos += 2 + struct.unpack('!H', data[pos:pos + 2])[0]
+        else:
+            pos += {_BYTE: 1, _TWO: 2, _FOUR: 4}[kind]
+        properties.append((identifier, data[start:pos]))
+    return properties, end
+
+
+def _encode_properties(properties: List[Tuple[int, bytes]]) -> bytes:
+    block = b''.join(encoded for _, encoded in properties)
+    return _encode_length(len(block)) + block
+
+
+def _share_filter(topic_filter: str) -> Tuple[Optional[str], str]:
+    """'$share/<group>/<filter>' -> (group, filter)"""
+    if topic_filter.startswith('$share/'):
+        _, group, topic_filter = topic_filter.split('/', 2)
+        return group, topic_filter
+    return None, topic_filter
+
+
+def _packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    return bytes([(packet_type << 4) | flags]) + _encode_length(len(body)) + body
+
+
+class _Session:
+    """One connected client"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.client_id = ''
+        self.version = 4
+        self.subscriptions: Dict[str, int] = {}
+        # Inbound MQTT 5 topic aliases of this connection
+        self.aliases: Dict[int, str] = {}
+        self.will: Optional[Tuple[str, bytes, bool]] = None
+        self.lock = Lock()
+
+    def send(self, data: bytes):
+        with self.lock:
+            self.sock.sendall(data)
+
+
+class MQTTBrokerStub:
+    """
+    In-process MQTT broker.
+    `on_publish(topic, payload, retain)` is called for every inbound PUBLISH,
+    which benchmarks use to timestamp messages coming out of the bridge.
+    `frozen` makes it read PUBLISH packets without acking or routing them
+    (a broker that hangs with the connection still open).
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, topic_alias_maximum: int = 65535):
+        self.host = host
+        self.port = port
+        self.topic_alias_maximum = topic_alias_maximum
+        self.frozen = False
+        self.retained: Dict[str, bytes] = {}
+        self.on_publish: Optional[Callable[[str, bytes, bool], None]] = None
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+        self._sessions: List[_Session] = []
+        # Round robin counter per shared subscription group
+        self._shared_turn: Dict[str, int] = {}
+        self._lock = Lock()
+        self._server: Optional[socket.socket] = None
+        self._stopped = Event()
+
+    def start(self) -> int:
+        """Start listening, returns the bound port"""
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen(64)
+        self.port = self._server.getsockname()[1]
+        Thread(target=self._accept_loop, daemon=True).start()
+        logger.info(f"🌐 MQTT broker stub listening on {self.host}:{self.port}")
+        return self.port
+
+    def stop(self):
+        self._stopped.set()
+        if self._server:
+            try:
+                # Wakes the accept loop so the port is released right away
+                self._server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            try:
+                self._server.close()
+            except OSError:
+                pass
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            try:
+                # Clients see the connection drop even while a read is pending
+                session.sock.shutdown(socket.SHUT_RDWR)
+                session.sock.close()
+            except OSError:
+                pass
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            Thread(target=self._client_loop, args=(_Session(sock),), daemon=True).start()
+
+    # ------------------------------------------------------------------
+    # Packet reading
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _recv_exact(sock: socket.socket, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("connection closed")
+            data += chunk
+        return data
+
+    def _read_packet(self, sock: socket.socket) -> Tuple[int, int, bytes]:
+        first = self._recv_exact(sock, 1)[0]
+        multiplier, length = 1, 0
+        while True:
+            byte = self._recv_exact(sock, 1)[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = self._recv_exact(sock, length) if length else b''
+        self.bytes_in += length + 2
+        return first >> 4, first & 0x0F, body
+
+    def _client_loop(self, session: _Session):
+        clean = False
+        try:
+            while not self._stopped.is_set():
+                packet_type, flags, body = self._read_packet(session.sock)
+                if packet_type == CONNECT:
+                    self._handle_connect(session, body)
+                elif packet_type == PUBLISH:
+                    self._handle_publish(session, flags, body)
+                elif packet_type == SUBSCRIBE:
+                    self._handle_subscribe(session, body)
+                elif packet_type == UNSUBSCRIBE:
+                    self._handle_unsubscribe(session, body)
+                elif packet_type == PINGREQ:
+                    session.send(_packet(PINGRESP, 0, b''))
+                elif packet_type == DISCONNECT:
+                    clean = True
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self._lock:
+                if session in self._sessions:
+                    self._sessions.remove(session)
+            try:
+                session.sock.close()
+            except OSError:
+                pass
+            if not clean and session.will and not self._stopped.is_set():
+                topic, payload, retain = session.will
+                self._route(topic, payload, retain, [])
+
+    # ------------------------------------------------------------------
+    # Handlers
+    # ------------------------------------------------------------------
+
+    def _handle_connect(self, session: _Session, body: bytes):
+        pos = 2 + struct.unpack('!H', body[:2])[0]
+        session.version = body[pos]
+        flags = body[pos + 1]
+        pos += 4  # protocol level + flags + keepalive
+        if session.version >= MQTT5:
+            _, pos = _read_properties(body, pos)
+
+        def read_field():
+            nonlocal pos
+            size = struct.unpack('!H', body[pos:pos + 2])[0]
+            value = body[pos + 2:pos + 2 + size]
+            pos += 2 + size
+            return value
+
+        session.client_id = read_field().decode()
+        if flags & 0x04:
+            if session.version >= MQTT5:
+                _, pos = _read_properties(body, pos)
+            will_topic = read_field().decode()
+            will_payload = read_field()
+            session.will = (will_topic, will_payload, bool(flags & 0x20))
+        with self._lock:
+            self._sessions.append(session)
+        if session.version >= MQTT5:
+            properties = [(TOPIC_ALIAS_MAXIMUM, struct.pack('!BH', TOPIC_ALIAS_MAXIMUM,
+                                                            self.topic_alias_maximum))]
+            session.send(_packet(CONNACK, 0, b'\x00\x00' + _encode_properties(properties)))
+        else:
+            session.send(_packet(CONNACK, 0, b'\x00\x00'))
+
+    def _handle_publish(self, session: _Session, flags: int, body: bytes):
+        if self.frozen:
+            return
+        qos = (flags >> 1) & 0x03
+        retain = bool(flags & 0x01)
+        size = struct.unpack('!H', body[:2])[0]
+        topic = body[2:2 + size].decode()
+        pos = 2 + size
+        if qos:
+            packet_id = body[pos:pos + 2]
+            pos += 2
+            session.send(_packet(PUBACK, 0, packet_id))
+        properties: List[Tuple[int, bytes]] = []
+        if session.version >= MQTT5:
+            properties, pos = _read_properties(body, pos)
+            alias = next((struct.unpack('!H', encoded[1:])[0]
+                          for identifier, encoded in properties if identifier == TOPIC_ALIAS), None)
+            if alias is not None:
+                # A topic sets (or remaps) the alias, an empty topic uses it
+                if topic:
+                    session.aliases[alias] = topic
+                else:
+                    topic = session.aliases[alias]
+                properties = [p for p in properties if p[0] != TOPIC_ALIAS]
+        payload = body[pos:]
+        self.messages_in += 1
+        if self.on_publish:
+            self.on_publish(topic, payload, retain)
+        self._route(topic, payload, retain, properties)
+
+    def _route(self, topic: str, payload: bytes, retain: bool, properties: List[Tuple[int, bytes]]):
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+        head = _encode_string(topic.encode())
+        data = {4: _packet(PUBLISH, 0, head + payload),
+                MQTT5: _packet(PUBLISH, 0, head + _encode_properties(properties) + payload)}
+        with self._lock:
+            sessions = list(self._sessions)
+        receivers = []
+        shared: Dict[str, List[_Session]] = {}
+        for session in sessions:
+            for topic_filter in list(session.subscriptions):
+                group, plain_filter = _share_filter(topic_filter)
+                if not topic_matches(plain_filter, topic):
+                    continue
+                if group is None:
+                    if session not in receivers:
+                        receivers.append(session)
+                else:
+                    shared.setdefault(topic_filter, []).append(session)
+        # One member of each shared subscription group gets the message
+        for topic_filter, members in shared.items():
+            turn = self._shared_turn.get(topic_filter, 0)
+            self._shared_turn[topic_filter] = turn + 1
+            member = members[turn % len(members)]
+            if member not in receivers:
+                receivers.append(member)
+        for session in receivers:
+            try:
+                session.send(data[MQTT5 if session.version >= MQTT5 else 4])
+                self.messages_out += 1
+            except OSError:
+                pass
+
+    def _handle_subscribe(self, session: _Session, body: bytes):
+        packet_id = body[:2]
+        pos = 2
+        if session.version >= MQTT5:
+            _, pos = _read_properties(body, pos)
+        granted = bytearray()
+        filters = []
+        while pos < len(body):
+            size = struct.unpack('!H', body[pos:pos + 2])[0]
+            topic_filter = body[pos + 2:pos + 2 + size].decode()
+            qos = body[pos + 2 + size] & 0x03
+            pos += 3 + size
+            session.subscriptions[topic_filter] = qos
+            filters.append(topic_filter)
+            granted.append(min(qos, 1))
+        no_properties = b'\x00' if session.version >= MQTT5 else b''
+        session.send(_packet(SUBACK, 0, packet_id + no_properties + bytes(granted)))
+        # Retained messages are not sent for shared subscriptions
+        filters = [f for f in filters if not f.startswith('$share/')]
+        for topic, payload in list(self.retained.items()):
+            if any(topic_matches(f, topic) for f in filters):
+                session.send(_packet(PUBLISH, 0x01,
+                                     _encode_string(topic.encode()) + no_properties + payload))
+
+    def _handle_unsubscribe(self, session: _Session, body: bytes):
+        packet_id = body[:2]
+        pos = 2
+        if session.version >= MQTT5:
+            _, pos = _read_properties(body, pos)
+        reasons = bytearray()
+        while pos < len(body):
+            size = struct.unpack('!H', body[pos:pos + 2])[0]
+            session.subscriptions.pop(body[pos + 2:pos + 2 + size].decode(), None)
+            pos += 2 + size
+            reasons.append(0)
+        if session.version >= MQTT5:
+            session.send(_packet(UNSUBACK, 0, packet_id + b'\x00' + bytes(reasons)))
+        else:
+            session.send(_packet(UNSUBACK, 0, packet_id))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Minimal MQTT broker stub")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--topic-alias-maximum', type=int, default=65535,
+                        help="topic aliases accepted per MQTT 5 connection")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    broker = MQTTBrokerStub(args.host, args.port, args.topic_alias_maximum)
+    broker.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        broker.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vidaa-U TV simulator
+Minimal WebSocket server speaking the subset of the Vidaa-U protocol used by
+hisense_mqtt_bridge.py (handshake, subscribe, state, sendkey, setvolume,
+setchannel) and pushes unsolicited notifications.
+Used for local testing and benchmarking without a physical TV.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import struct
+import base64
+import hashlib
+import argparse
+import logging
+from threading import Thread, Lock, Event
+from typing import Optional, Dict, Any, List, Callable
+
+logger = logging.getLogger('VidaaSimulator')
+
+WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+SOURCE_KEYS = {
+    'KEY_HDMI1': 'HDMI1',
+    'KEY_HDMI2': 'HDMI2',
+    'KEY_HDMI3': 'HDMI3',
+    'KEY_HDMI4': 'HDMI4',
+    'KEY_TV': 'TV',
+    'KEY_AV': 'AV',
+    'KEY_DTMB': 'DTMB',
+    'KEY_IPTV': 'IPTV',
+}
+
+# ============================================================================
+# WEBSOCKET FRAMING
+# ============================================================================
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return data
+
+
+def read_frame(sock: socket.socket):
+    """Read one (masked) client frame, returns (opcode, payload)"""
+    head = _recv_exact(sock, 2)
+    opcode = head[0] & 0x0F
+    masked = head[1] & 0x80
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', _recv_exact(sock, 2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', _recv_exact(sock, 8))[0]
+    mask = _recv_exact(sock, 4) if masked else b''
+    payload = _recv_exact(sock, length)
+    if masked:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+def build_frame(payload: bytes, opcode: int = 0x1) -> bytes:
+    """Build one unmasked server frame"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def accept_handshake(sock: socket.socket) -> bool:
+    """Answer the HTTP upgrade request"""
+    request = b''
+    while b'\r\n\r\n' not in request:
+        chunk = sock.recv(4096)
+        if not chunk:
+            return False
+        request += chunk
+    key = None
+    for line in request.split(b'\r\n'):
+        if line.lower().startswith(b'sec-websocket-key:'):
+            key = line.split(b':', 1)[1].strip()
+    if key is None:
+        return False
+    accept = base64.b64encode(hashlib.sha1(key + WS_GUID).digest())
+    sock.sendall(
+        b'HTTP/1.1 101 Switching Protocols\r\n'
+        b'Upgrade: websocket\r\n'
+        b'Connection: Upgrade\r\n'
+        b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n'
+    )
+    return True
+
+
+# ============================================================================
+# SIMULATED TV
+# ============================================================================
+
+class SimulatedTV:
+    """
+    One simulated Vidaa-U TV listening on a TCP port.
+    - encrypted: state frames are sent as base64 AES-128-CBC payloads
+    - lag: seconds added before every response
+    - drop: probability of silently dropping a request
+    - frozen: read but never answer any frame, pings included (a TV that
+      vanished without closing its sockets)
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 encrypted: bool = False, lag: float = 0.0, drop: float = 0.0,
+                 name: str = 'sim'):
+        self.host = host
+        self.port = port
+        self.encrypted = encrypted
+        self.lag = lag
+        self.drop = drop
+        self.frozen = False
+        self.name = name
+        self.cipher_key = os.urandom(16)
+        self.cipher_iv = os.urandom(16)
+        self.state = {
+            'power': True,
+            'volume': 20,
+            'mute': False,
+            'sourceid': 'HDMI1',
+            'channel': 1,
+        }
+        self.received: List[Dict[str, Any]] = []
+        self.keep_received = True
+        # Called as on_request(request, monotonic_time) for every frame
+        self.on_request: Optional[Callable[[Dict[str, Any], float], None]] = None
+        self.frames_in = 0
+        self.frames_out = 0
+        self._lock = Lock()
+        self._clients: List[socket.socket] = []
+        self._server: Optional[socket.socket] = None
+        self._stopped = Event()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> int:
+        """Start listening, returns the bound port"""
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen(16)
+        self.port = self._server.getsockname()[1]
+        Thread(target=self._accept_loop, daemon=True).start()
+        logger.info(f"📺 Simulated TV {self.name} listening on {self.host}:{self.port}")
+        return self.port
+
+    def stop(self):
+        """Stop the server and drop every client"""
+        self._stopped.set()
+        if self._server:
+            try:
+                self._server.close()
+            except OSError:
+                pass
+        self.drop_clients()
+
+    def drop_clients(self):
+        """Close every client socket (simulates a TV going away)"""
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+                client.close()
+            except OSError:
+                pass
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            Thread(target=self._client_loop, args=(client,), daemon=True).start()
+
+    def _client_loop(self, client: socket.socket):
+        try:
+            if not accept_handshake(client):
+                client.close()
+                return
+            with self._lock:
+                self._clients.append(client)
+            while not self._stopped.is_set():
+                opcode, payload = read_frame(client)
+                if self.frozen:
+                    continue
+                if opcode == 0x8:
+                    client.sendall(build_frame(payload[:2], 0x8))
+                    break
+                if opcode == 0x9:
+                    client.sendall(build_frame(payload, 0xA))
+                    continue
+                if opcode != 0x1:
+                    continue
+                self.frames_in += 1
+                self._handle(client, payload)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self._lock:
+                if client in self._clients:
+                    self._clients.remove(client)
+            try:
+                client.close()
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------------
+    # Protocol
+    # ------------------------------------------------------------------
+
+    def _handle(self, client: socket.socket, payload: bytes):
+        received_at = time.monotonic()
+        try:
+            request = json.loads(payload)
+        except ValueError:
+            return
+        if self.keep_received:
+            self.received.append(request)
+        if self.on_request:
+            self.on_request(request, received_at)
+        if self.drop and random.random() < self.drop:
+            return
+        if self.lag:
+            time.sleep(self.lag)
+
+        action = request.get('action', '').lower()
+        if action == 'handshake':
+            response = {'action': 'handshake', 'type': 'response'}
+            if self.encrypted:
+                response['cipher'] = {
+                    'key': base64.b64encode(self.cipher_key).decode(),
+                    'iv': base64.b64encode(self.cipher_iv).decode(),
+                }
+            self._send(client, response, encrypt=False)
+            return
+        if action == 'subscribe':
+            self._send(client, {'action': 'subscribe', 'type': 'response'})
+            return
+        if action == 'sendkey':
+            self._apply_key(request.get('keycode', ''))
+        elif action == 'setvolume':
+            self.state['volume'] = int(request.get('volume', 0))
+        elif action == 'setchannel':
+            self.state['channel'] = int(request.get('channel', 0))
+        elif action != 'state':
+            return
+        response = {'action': 'state', 'type': 'response'}
+        if 'id' in request:
+            response['id'] = request['id']
+        response.update(self.state)
+        self._send(client, response)
+
+    def _apply_key(self, keycode: str):
+        state = self.state
+        if keycode == 'KEY_POWER':
+            state['power'] = not state['power']
+        elif keycode == 'KEY_VOLUMEUP':
+            state['volume'] = min(100, state['volume'] + 1)
+        elif keycode == 'KEY_VOLUMEDOWN':
+            state['volume'] = max(0, state['volume'] - 1)
+        elif keycode == 'KEY_MUTE':
+            state['mute'] = not state['mute']
+        elif keycode == 'KEY_CHANNELUP':
+            state['channel'] += 1
+        elif keycode == 'KEY_CHANNELDOWN':
+            state['channel'] = max(0, state['channel'] - 1)
+        elif keycode in SOURCE_KEYS:
+            state['sourceid'] = SOURCE_KEYS[keycode]
+
+    def _encrypt(self, text: str) -> str:
+        from Crypto.Cipher import AES
+        from Crypto.Util.Padding import pad
+        cipher = AES.new(self.cipher_key, AES.MODE_CBC, self.cipher_iv)
+        return base64.b64encode(cipher.encrypt(pad(text.encode(), AES.block_size))).decode()
+
+    def _send(self, client: socket.socket, message: Dict[str, Any], encrypt: bool = True):
+        text = json.dumps(message)
+        if encrypt and self.encrypted:
+            text = self._encrypt(text)
+        try:
+            client.sendall(build_frame(text.encode()))
+            self.frames_out += 1
+        except OSError:
+            pass
+
+    def push_state(self, **changes):
+        """Change the TV state locally (e.g. physical remote) and notify clients"""
+        self.state.update(changes)
+        message = {'action': 'state', 'type': 'notify'}
+        message.update(self.state)
+        self.push(message)
+
+    def push_event(self, action: str, **fields):
+        """Send a partial notification (volumechange, sourceswitch, app...)"""
+        message = {'action': action, 'type': 'notify'}
+        message.update(fields)
+        self.push(message)
+
+    def push(self, message: Dict[str, Any]):
+        """Send an unsolicited notification to every connected client"""
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            self._send(client, message)
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Vidaa-U TV simulator")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=10001)
+    parser.add_argument('--count', type=int, default=1, help="number of TVs on consecutive ports")
+    parser.add_argument('--encrypted', action='store_true')
+    parser.add_argument('--lag', type=float, default=0.0)
+    parser.add_argument('--drop', type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    tvs = []
+    for i in range(args.count):
+        tv = SimulatedTV(args.host, args.port + i if args.port else 0, args.encrypted,
+                         args.lag, args.drop, name=f"sim{i}")
+        tv.start()
+        tvs.append(tv)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for tv in tvs:
+            tv.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())